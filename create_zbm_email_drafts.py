@@ -3,111 +3,52 @@ import numpy as np
 from datetime import datetime
 import win32com.client as win32
 import os
+import sys
+import html
+from zbm_common import load_master_tracker, build_rules, compute_final_answers, PAIR_RULES, TRACKER_COLUMNS
 
-def create_zbm_email_drafts():
+# Email <head> with the report styles, shared by every draft
+EMAIL_HTML_HEAD = """
+            <html>
+            <head>
+                <style>
+                    body { font-family: Arial, sans-serif; margin: 20px; }
+                    h2 { color: #2E86AB; }
+                    table { border-collapse: collapse; width: 100%; margin-top: 20px; }
+                    th, td { border: 1px solid #ddd; padding: 8px; text-align: center; }
+                    th { background-color: #D9E1F2; font-weight: bold; }
+                    .section-header { background-color: #4472C4; color: white; font-weight: bold; }
+                    .total-row { background-color: #E7E6E6; font-weight: bold; }
+                    .summary { background-color: #F2F2F2; padding: 15px; margin-bottom: 20px; border-left: 4px solid #2E86AB; }
+                </style>
+            </head>"""
+
+def create_zbm_email_drafts(open_first=False):
     """
     Create Outlook email drafts for each ZBM with their report data in table format
-    Opens Outlook windows but doesn't send - user can review and send manually
+    Saves them to the Outlook Drafts folder but doesn't send - user can review and send manually
+    With open_first, the first draft is also opened in a window as a preview
     """
     
     print("📧 Starting ZBM Email Draft Creation...")
     
-    # Read master tracker data
-    print("📖 Reading master_tracker.csv...")
-    try:
-        df = pd.read_csv('master_tracker.csv', encoding='latin-1', low_memory=False)
-        print(f"✅ Successfully loaded {len(df)} records from master_tracker.csv")
-    except Exception as e:
-        print(f"❌ Error reading master_tracker.csv: {e}")
-        return
-    
-    # Clean and prepare data
-    print("🧹 Cleaning and preparing data...")
-    
-    # Ensure required columns exist
-    required_columns = ['ZBM Terr Code', 'ZBM Name', 'ZBM EMAIL_ID',
-                        'ABM Terr Code', 'ABM Name', 'ABM EMAIL_ID',
-                        'TBM HQ', 'TBM EMAIL_ID',
-                        'Doctor: Customer Code', 'Assigned Request Ids', 'Request Status', 'Rto Reason']
-    missing = [c for c in required_columns if c not in df.columns]
-    if missing:
-        print(f"❌ Missing required columns in master_tracker.csv: {missing}")
+    # Read and clean the master tracker (only the columns used), with the repeated string
+    # columns this script groups and counts on as categoricals
+    df = load_master_tracker(TRACKER_COLUMNS,
+                             category_columns=['ZBM Terr Code', 'ABM Terr Code', 'TBM EMAIL_ID', 'Doctor: Customer Code',
+                                               'Assigned Request Ids', 'Rto Reason'])
+    if df is None:
         return
 
-    # Remove rows where key fields are null or empty
-    df = df.dropna(subset=['ZBM Terr Code', 'ZBM Name', 'ABM Terr Code', 'ABM Name', 'TBM HQ'])
-    df = df[df['ZBM Terr Code'].astype(str).str.strip() != '']
-    df = df[df['ABM Terr Code'].astype(str).str.strip() != '']
-    df = df[df['TBM HQ'].astype(str).str.strip() != '']
-
-    print(f"📊 After cleaning: {len(df)} records remaining")
-
     # Compute Final Answer per unique request id using corrected rules
     print("🧠 Computing final status per unique Request Id using corrected rules...")
     try:
-        def normalize(text):
-            normalized = str(text).strip().casefold()
-            normalized = normalized.replace('  ', ' ')  # Fix spacing issues
-            return normalized
+        # Rules from logic.xlsx plus the missing rules identified from validation, keyed by the
+        # frozenset of normalized statuses so status order never matters
+        rules = build_rules(PAIR_RULES)
 
-        # Load rules from logic.xlsx
-        xls_rules = pd.ExcelFile('logic.xlsx')
-        sheet2 = pd.read_excel(xls_rules, 'Sheet2')
-
-        rules = {}
-        for _, row in sheet2.iterrows():
-            statuses = [normalize(s) for s in row.drop('Final Answer').dropna().tolist()]
-            statuses = tuple(sorted(set(statuses)))
-            rules[statuses] = row['Final Answer']
-
-        # Add missing rules identified from validation
-        additional_rules = {
-            ('action pending / in process', 'delivered'): 'Delivered',
-            ('action pending / in process', 'dispatched & in transit'): 'Dispatched & In Transit',
-            ('action pending / in process', 'dispatch pending'): 'Dispatch Pending',
-            ('action pending / in process', 'out of stock'): 'Out of stock',
-            ('action pending / in process', 'return'): 'Return',
-            ('delivered', 'return'): 'Delivered',
-            ('dispatch pending', 'delivered'): 'Delivered',
-            ('dispatch pending', 'dispatched & in transit'): 'Dispatched & In Transit',
-            ('dispatch pending', 'return'): 'Return',
-            ('dispatched & in transit', 'return'): 'Dispatched & In Transit',
-            ('out of stock', 'return'): 'Out of stock',
-            ('request raised', 'action pending / in process'): 'Action pending / In Process',
-            ('request raised', 'delivered'): 'Delivered',
-            ('request raised', 'dispatch pending'): 'Dispatch Pending',
-            ('request raised', 'dispatched & in transit'): 'Dispatched & In Transit',
-            ('request raised', 'out of stock'): 'Out of stock',
-            ('request raised', 'return'): 'Return',
-        }
-        
-        rules.update(additional_rules)
-
-        # Apply rules to compute Final Answer
-        def compute_final_answer(request_id):
-            request_data = df[df['Assigned Request Ids'] == request_id]
-            if len(request_data) == 0:
-                return 'Unknown'
-            
-            statuses = [normalize(s) for s in request_data['Request Status'].dropna().unique()]
-            statuses = tuple(sorted(set(statuses)))
-            
-            if statuses in rules:
-                return rules[statuses]
-            else:
-                # If no rule found, return the most common status
-                return request_data['Request Status'].mode().iloc[0] if len(request_data['Request Status'].mode()) > 0 else 'Unknown'
-
-        # Apply final answer computation
-        unique_requests = df['Assigned Request Ids'].unique()
-        print(f"🔍 Computing final answers for {len(unique_requests)} unique requests...")
-        
-        final_answers = {}
-        for req_id in unique_requests:
-            final_answers[req_id] = compute_final_answer(req_id)
-        
-        # Map final answers back to dataframe
-        df['Final Answer'] = df['Assigned Request Ids'].map(final_answers)
+        # Apply rules to compute Final Answer for all requests at once
+        df['Final Answer'] = compute_final_answers(df, rules).astype('category')
         
         print("✅ Final Answer computation completed")
         
@@ -115,13 +56,100 @@ def create_zbm_email_drafts():
         print(f"❌ Error computing final answers: {e}")
         return
 
+    # Calculate metrics for every ABM in one pass, keyed by ZBM and ABM code
+    print("📊 Calculating ABM metrics...")
+    abm_keys = ['ZBM Terr Code', 'ABM Terr Code']
+    request_ids = df['Assigned Request Ids']
+    
+    # Final Answer categories: HO Section (A + B), HUB Section (E), Delivery Status (G + H)
+    status_groups = {
+        'Cancelled/Out of Stock': ['Out of stock', 'On hold', 'Not permitted'],
+        'Action Pending at HO': ['Action pending / In Process'],
+        'Pending for Dispatch': ['Dispatch Pending'],
+        'Delivered': ['Delivered'],
+        'Dispatched & In Transit': ['Dispatched & In Transit']
+    }
+    
+    # RTO (I) and RTO Reasons come from the Rto Reason field
+    rto_reasons = {
+        'Incomplete Address': 'Incomplete Address',
+        'Doctor Non Contactable': 'Non contactable',
+        'Doctor Refused to Accept': 'refused to accept',
+        'Hold Delivery': 'Hold Delivery'
+    }
+    
+    # Final Answer holds one value per request, so the status buckets are counted on a table with
+    # one row per (ABM, request): a plain sum of flags instead of an nunique of request ids per bucket.
+    # Final Answer is categorical: test its few categories and expand to rows through the integer codes
+    request_rows = df.loc[request_ids.notna(), abm_keys + ['Assigned Request Ids', 'Final Answer']].drop_duplicates(abm_keys + ['Assigned Request Ids'])
+    answer_codes = request_rows['Final Answer'].cat.codes.to_numpy()
+    answer_categories = request_rows['Final Answer'].cat.categories
+    status_counts = pd.DataFrame(
+        {col: np.append(answer_categories.isin(answers), False)[answer_codes] for col, answers in status_groups.items()},
+        index=pd.MultiIndex.from_frame(request_rows[abm_keys])
+    ).groupby(level=abm_keys, observed=True).sum()
+    
+    # The Rto Reason can differ between rows of a request, so the RTO breakdown is built on the
+    # distinct (ABM, request, reason) rows: flag each reason bucket, take any() per request and
+    # sum per ABM. Rto Reason is categorical: match each reason against its few categories once
+    # and expand to rows through the codes
+    rto_rows = (df.loc[request_ids.notna() & df['Rto Reason'].notna(), abm_keys + ['Assigned Request Ids', 'Rto Reason']]
+                .drop_duplicates())
+    rto_codes = rto_rows['Rto Reason'].cat.codes.to_numpy()
+    rto_categories = rto_rows['Rto Reason'].cat.categories.to_series().astype(str)
+    rto_flags = {'RTO': np.ones(len(rto_rows), dtype=bool)}
+    for col, reason in rto_reasons.items():
+        rto_flags[col] = rto_categories.str.contains(reason, case=False).to_numpy(dtype=bool)[rto_codes]
+    rto_counts = (pd.DataFrame(rto_flags, index=pd.MultiIndex.from_frame(rto_rows[abm_keys + ['Assigned Request Ids']]))
+                  .groupby(level=abm_keys + ['Assigned Request Ids'], observed=True).any()
+                  .groupby(level=abm_keys, observed=True).sum())
+    
+    abm_metrics = df.groupby(abm_keys, observed=True).agg(
+        **{'Unique TBMs': ('TBM EMAIL_ID', 'nunique'),
+           'Unique HCPs': ('Doctor: Customer Code', 'nunique')}
+    )
+    abm_metrics = abm_metrics.join(status_counts).join(rto_counts).fillna(0).astype('int64')
+    
+    # Calculated fields
+    abm_metrics['Pending for Invoicing'] = 0  # Placeholder
+    abm_metrics['Requests Dispatched'] = abm_metrics['Delivered'] + abm_metrics['Dispatched & In Transit'] + abm_metrics['RTO']
+    abm_metrics['Sent to HUB'] = abm_metrics['Pending for Invoicing'] + abm_metrics['Pending for Dispatch'] + abm_metrics['Requests Dispatched']
+    abm_metrics['Requests Raised'] = abm_metrics['Cancelled/Out of Stock'] + abm_metrics['Action Pending at HO'] + abm_metrics['Sent to HUB']
+    
+    metric_columns = [
+        'Unique TBMs', 'Unique HCPs', 'Requests Raised', 'Cancelled/Out of Stock',
+        'Action Pending at HO', 'Sent to HUB', 'Pending for Invoicing', 'Pending for Dispatch',
+        'Requests Dispatched', 'Delivered', 'Dispatched & In Transit', 'RTO',
+        'Incomplete Address', 'Doctor Non Contactable', 'Doctor Refused to Accept', 'Hold Delivery'
+    ]
+    abm_metrics = abm_metrics[metric_columns]
+    
+    # ABMs (code, name, email) under each ZBM with their metrics, found once and sorted by ABM code
+    abm_meta = (df[['ZBM Terr Code', 'ABM Terr Code', 'ABM Name', 'ABM EMAIL_ID']]
+                .drop_duplicates()
+                .sort_values(['ZBM Terr Code', 'ABM Terr Code'], kind='stable')
+                .join(abm_metrics, on=abm_keys))
+    
+    # Escape the name columns for HTML once here rather than per cell, so an '&' or '<' in a name
+    # cannot break the email table
+    abm_meta['Area Name'] = (abm_meta['ABM Terr Code'].astype(str) + ' - ' + abm_meta['ABM Name'].astype(str)).map(html.escape)
+    abm_meta['ABM Name'] = abm_meta['ABM Name'].astype(str).map(html.escape)
+    abms_by_zbm = dict(tuple(abm_meta.groupby('ZBM Terr Code', observed=True, sort=False)))
+    
+    # ZBM totals over the listed ABM rows, for the summary box and TOTAL row
+    zbm_totals = abm_meta.groupby('ZBM Terr Code', observed=True)[metric_columns].sum()
+
     # Get unique ZBMs
     zbms = df[['ZBM Terr Code', 'ZBM Name', 'ZBM EMAIL_ID']].drop_duplicates().sort_values('ZBM Terr Code')
     print(f"📋 Found {len(zbms)} unique ZBMs")
 
-    # Initialize Outlook
+    # Initialize Outlook once, early-bound through the generated type library when it can be
+    # built (saves an IDispatch name lookup on every property set); fall back to late binding
     try:
-        outlook = win32.Dispatch('outlook.application')
+        try:
+            outlook = win32.gencache.EnsureDispatch('Outlook.Application')
+        except Exception:
+            outlook = win32.Dispatch('outlook.application')
         print("✅ Outlook application initialized")
     except Exception as e:
         print(f"❌ Error initializing Outlook: {e}")
@@ -131,12 +159,11 @@ def create_zbm_email_drafts():
     successful_emails = 0
     failed_emails = 0
     
-    # Process each ZBM
-    for i, (_, zbm_row) in enumerate(zbms.iterrows()):
-        zbm_code = zbm_row['ZBM Terr Code']
-        zbm_name = zbm_row['ZBM Name']
-        zbm_email = zbm_row['ZBM EMAIL_ID']
-        
+    # Build every ZBM's email first (pure pandas/string work), then hand them to Outlook in
+    # one tight loop on this thread - Outlook COM objects must stay on the thread that created them
+    drafts = []
+    current_date = datetime.now().strftime("%B %d, %Y")
+    for i, (zbm_code, zbm_name, zbm_email) in enumerate(zbms.itertuples(index=False, name=None)):
         # Handle NaN names and emails
         if pd.isna(zbm_name):
             zbm_name = "Unknown"
@@ -145,116 +172,45 @@ def create_zbm_email_drafts():
             failed_emails += 1
             continue
         
-        print(f"📧 Creating email draft for ZBM {i+1}/{len(zbms)}: {zbm_name} ({zbm_code})")
-        print(f"   📬 Email: {zbm_email}")
-        
         try:
-            # Filter data for this ZBM
-            zbm_data = df[df['ZBM Terr Code'] == zbm_code].copy()
+            # Get unique ABMs under this ZBM (every ZBM with rows has an entry, so no per-ZBM filter of df)
+            abms = abms_by_zbm.get(zbm_code)
             
-            if len(zbm_data) == 0:
+            if abms is None:
                 print(f"⚠️ No data found for ZBM: {zbm_code}")
                 failed_emails += 1
                 continue
             
-            # Get unique ABMs under this ZBM
-            abms = zbm_data[['ABM Terr Code', 'ABM Name', 'ABM EMAIL_ID']].drop_duplicates().sort_values('ABM Terr Code')
-            
             # Create summary data for email table
             summary_data = []
             
-            for _, abm_row in abms.iterrows():
-                abm_code = abm_row['ABM Terr Code']
-                abm_name = abm_row['ABM Name']
-                abm_email = abm_row['ABM EMAIL_ID']
-                
-                abm_data = zbm_data[zbm_data['ABM Terr Code'] == abm_code]
-                
-                # Calculate metrics for this ABM
-                unique_tbms = abm_data['TBM EMAIL_ID'].nunique()
-                unique_hcps = abm_data['Doctor: Customer Code'].nunique()
-                
-                # HO Section (A + B)
-                request_cancelled_out_of_stock = abm_data[abm_data['Final Answer'].isin(['Out of stock', 'On hold', 'Not permitted'])]['Assigned Request Ids'].nunique()
-                action_pending_at_ho = abm_data[abm_data['Final Answer'].isin(['Action pending / In Process'])]['Assigned Request Ids'].nunique()
-                
-                # HUB Section (D + E + F)
-                pending_for_invoicing = 0  # Placeholder
-                pending_for_dispatch = abm_data[abm_data['Final Answer'].isin(['Dispatch Pending'])]['Assigned Request Ids'].nunique()
-                
-                # Delivery Status (G + H + I)
-                delivered = abm_data[abm_data['Final Answer'].isin(['Delivered'])]['Assigned Request Ids'].nunique()
-                dispatched_in_transit = abm_data[abm_data['Final Answer'].isin(['Dispatched & In Transit'])]['Assigned Request Ids'].nunique()
-                rto = abm_data[abm_data['Rto Reason'].notna()]['Assigned Request Ids'].nunique()
-                
-                # Calculated fields
-                requests_dispatched = delivered + dispatched_in_transit + rto
-                sent_to_hub = pending_for_invoicing + pending_for_dispatch + requests_dispatched
-                requests_raised = request_cancelled_out_of_stock + action_pending_at_ho + sent_to_hub
-                
-                # RTO Reasons
-                rto_data = abm_data[abm_data['Rto Reason'].notna()]
-                incomplete_address = rto_data[rto_data['Rto Reason'].str.contains('Incomplete Address', case=False, na=False)]['Assigned Request Ids'].nunique()
-                doctor_non_contactable = rto_data[rto_data['Rto Reason'].str.contains('Non contactable', case=False, na=False)]['Assigned Request Ids'].nunique()
-                doctor_refused_to_accept = rto_data[rto_data['Rto Reason'].str.contains('refused to accept', case=False, na=False)]['Assigned Request Ids'].nunique()
-                hold_delivery = rto_data[rto_data['Rto Reason'].str.contains('Hold Delivery', case=False, na=False)]['Assigned Request Ids'].nunique()
-                
-                # Create Area Name
-                area_name = f"{abm_code} - {abm_name}"
-                
+            for area_name, abm_name, *metrics in abms[['Area Name', 'ABM Name'] + metric_columns].itertuples(index=False, name=None):
                 summary_row = {
                     'Area Name': area_name,
                     'ABM Name': abm_name,
-                    'Unique TBMs': unique_tbms,
-                    'Unique HCPs': unique_hcps,
-                    'Requests Raised': requests_raised,
-                    'Cancelled/Out of Stock': request_cancelled_out_of_stock,
-                    'Action Pending at HO': action_pending_at_ho,
-                    'Sent to HUB': sent_to_hub,
-                    'Pending for Invoicing': pending_for_invoicing,
-                    'Pending for Dispatch': pending_for_dispatch,
-                    'Requests Dispatched': requests_dispatched,
-                    'Delivered': delivered,
-                    'Dispatched & In Transit': dispatched_in_transit,
-                    'RTO': rto,
-                    'Incomplete Address': incomplete_address,
-                    'Doctor Non Contactable': doctor_non_contactable,
-                    'Doctor Refused to Accept': doctor_refused_to_accept,
-                    'Hold Delivery': hold_delivery
+                    **dict(zip(metric_columns, metrics))
                 }
                 
                 summary_data.append(summary_row)
             
-            # Create email content
-            current_date = datetime.now().strftime("%B %d, %Y")
+            totals = zbm_totals.loc[zbm_code]
             
+            # Create email content
             # Email subject
             subject = f"ZBM Summary Report - {zbm_name} ({zbm_code}) - {current_date}"
+            zbm_label = html.escape(f"{zbm_name} ({zbm_code})")
             
-            # Create HTML table for email body
-            html_body = f"""
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                    h2 {{ color: #2E86AB; }}
-                    table {{ border-collapse: collapse; width: 100%; margin-top: 20px; }}
-                    th, td {{ border: 1px solid #ddd; padding: 8px; text-align: center; }}
-                    th {{ background-color: #D9E1F2; font-weight: bold; }}
-                    .section-header {{ background-color: #4472C4; color: white; font-weight: bold; }}
-                    .total-row {{ background-color: #E7E6E6; font-weight: bold; }}
-                    .summary {{ background-color: #F2F2F2; padding: 15px; margin-bottom: 20px; border-left: 4px solid #2E86AB; }}
-                </style>
-            </head>
+            # Create HTML table for email body, collected as parts and joined once at the end
+            html_parts = [EMAIL_HTML_HEAD, f"""
             <body>
                 <h2>ZBM Summary Report</h2>
                 
                 <div class="summary">
-                    <p><strong>ZBM:</strong> {zbm_name} ({zbm_code})</p>
+                    <p><strong>ZBM:</strong> {zbm_label}</p>
                     <p><strong>Report Date:</strong> {current_date}</p>
                     <p><strong>Total ABMs:</strong> {len(summary_data)}</p>
-                    <p><strong>Total Requests:</strong> {sum(d['Requests Raised'] for d in summary_data)}</p>
-                    <p><strong>Total RTO:</strong> {sum(d['RTO'] for d in summary_data)}</p>
+                    <p><strong>Total Requests:</strong> {totals['Requests Raised']}</p>
+                    <p><strong>Total RTO:</strong> {totals['RTO']}</p>
                 </div>
                 
                 <table>
@@ -284,11 +240,10 @@ def create_zbm_email_drafts():
                         <th>Doctor Refused<br/>to Accept</th>
                         <th>Hold<br/>Delivery</th>
                     </tr>
-            """
+            """]
             
             # Add data rows
-            for data in summary_data:
-                html_body += f"""
+            html_parts.extend(f"""
                     <tr>
                         <td>{data['Area Name']}</td>
                         <td>{data['ABM Name']}</td>
@@ -309,34 +264,34 @@ def create_zbm_email_drafts():
                         <td>{data['Doctor Refused to Accept']}</td>
                         <td>{data['Hold Delivery']}</td>
                     </tr>
-                """
+                """ for data in summary_data)
             
             # Add totals row
             if summary_data:
-                html_body += f"""
+                html_parts.append(f"""
                     <tr class="total-row">
                         <td><strong>TOTAL</strong></td>
                         <td></td>
-                        <td><strong>{sum(d['Unique TBMs'] for d in summary_data)}</strong></td>
-                        <td><strong>{sum(d['Unique HCPs'] for d in summary_data)}</strong></td>
-                        <td><strong>{sum(d['Requests Raised'] for d in summary_data)}</strong></td>
-                        <td><strong>{sum(d['Cancelled/Out of Stock'] for d in summary_data)}</strong></td>
-                        <td><strong>{sum(d['Action Pending at HO'] for d in summary_data)}</strong></td>
-                        <td><strong>{sum(d['Sent to HUB'] for d in summary_data)}</strong></td>
-                        <td><strong>{sum(d['Pending for Invoicing'] for d in summary_data)}</strong></td>
-                        <td><strong>{sum(d['Pending for Dispatch'] for d in summary_data)}</strong></td>
-                        <td><strong>{sum(d['Requests Dispatched'] for d in summary_data)}</strong></td>
-                        <td><strong>{sum(d['Delivered'] for d in summary_data)}</strong></td>
-                        <td><strong>{sum(d['Dispatched & In Transit'] for d in summary_data)}</strong></td>
-                        <td><strong>{sum(d['RTO'] for d in summary_data)}</strong></td>
-                        <td><strong>{sum(d['Incomplete Address'] for d in summary_data)}</strong></td>
-                        <td><strong>{sum(d['Doctor Non Contactable'] for d in summary_data)}</strong></td>
-                        <td><strong>{sum(d['Doctor Refused to Accept'] for d in summary_data)}</strong></td>
-                        <td><strong>{sum(d['Hold Delivery'] for d in summary_data)}</strong></td>
+                        <td><strong>{totals['Unique TBMs']}</strong></td>
+                        <td><strong>{totals['Unique HCPs']}</strong></td>
+                        <td><strong>{totals['Requests Raised']}</strong></td>
+                        <td><strong>{totals['Cancelled/Out of Stock']}</strong></td>
+                        <td><strong>{totals['Action Pending at HO']}</strong></td>
+                        <td><strong>{totals['Sent to HUB']}</strong></td>
+                        <td><strong>{totals['Pending for Invoicing']}</strong></td>
+                        <td><strong>{totals['Pending for Dispatch']}</strong></td>
+                        <td><strong>{totals['Requests Dispatched']}</strong></td>
+                        <td><strong>{totals['Delivered']}</strong></td>
+                        <td><strong>{totals['Dispatched & In Transit']}</strong></td>
+                        <td><strong>{totals['RTO']}</strong></td>
+                        <td><strong>{totals['Incomplete Address']}</strong></td>
+                        <td><strong>{totals['Doctor Non Contactable']}</strong></td>
+                        <td><strong>{totals['Doctor Refused to Accept']}</strong></td>
+                        <td><strong>{totals['Hold Delivery']}</strong></td>
                     </tr>
-                """
+                """)
             
-            html_body += """
+            html_parts.append("""
                 </table>
                 
                 <p style="margin-top: 30px; font-size: 12px; color: #666;">
@@ -344,19 +299,34 @@ def create_zbm_email_drafts():
                 </p>
             </body>
             </html>
-            """
+            """)
+            html_body = ''.join(html_parts)
+            drafts.append((i, zbm_code, zbm_name, zbm_email, subject, html_body, len(summary_data), totals['RTO']))
             
+        except Exception as e:
+            print(f"❌ Error creating email for ZBM {zbm_code}: {e}")
+            failed_emails += 1
+            continue
+    
+    # Create the Outlook drafts
+    for i, zbm_code, zbm_name, zbm_email, subject, html_body, abm_count, total_rto in drafts:
+        print(f"📧 Creating email draft for ZBM {i+1}/{len(zbms)}: {zbm_name} ({zbm_code})")
+        print(f"   📬 Email: {zbm_email}")
+        
+        try:
             # Create Outlook email
             mail = outlook.CreateItem(0)  # 0 = olMailItem
             mail.To = zbm_email
             mail.Subject = subject
             mail.HTMLBody = html_body
             
-            # Display the email (opens window but doesn't send)
-            mail.Display()
+            # Save the email to Drafts (doesn't send); only the first one is opened when asked
+            mail.Save()
+            if open_first and successful_emails == 0:
+                mail.Display()
             
             print(f"✅ Email draft created for {zbm_name}")
-            print(f"   📊 ABMs: {len(summary_data)}, Total RTO: {sum(d['RTO'] for d in summary_data)}")
+            print(f"   📊 ABMs: {abm_count}, Total RTO: {total_rto}")
             
             successful_emails += 1
             
@@ -368,8 +338,8 @@ def create_zbm_email_drafts():
     print(f"\n🎉 Email Draft Creation Completed!")
     print(f"✅ Successful: {successful_emails}")
     print(f"❌ Failed: {failed_emails}")
-    print(f"📧 {successful_emails} Outlook windows opened with email drafts")
-    print(f"💡 Review each email and send manually as needed")
+    print(f"📧 {successful_emails} email drafts saved to the Outlook Drafts folder")
+    print(f"💡 Review each email in Drafts and send manually as needed")
 
 if __name__ == "__main__":
-    create_zbm_email_drafts()
+    create_zbm_email_drafts(open_first='--open-first' in sys.argv)
@@ -3,19 +3,28 @@
 ZBM Email Preview Generator
 Creates professional email content for each ZBM with precise data matching
 DISPLAYS EMAIL CONTENT - DOES NOT SEND
+Run with --quiet to show only warnings and the overall progress, not each ZBM's progress
 """
 
 import pandas as pd
 import os
 from datetime import datetime
 import warnings
+import logging
+import sys
+from pathlib import Path
 from openpyxl import load_workbook
 from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
 from copy import copy as copy_style
+from logic_rules import load_status_mapping
 
 # Suppress pandas warnings
 warnings.filterwarnings('ignore', category=FutureWarning, module='pandas')
 
+# Per-ZBM progress goes through logging; run as a script it is shown on stdout with the other
+# messages unless --quiet is given, and an importing caller can silence it
+logger = logging.getLogger(__name__)
+
 def create_email_preview():
     """Create email preview for each ZBM with precise data matching"""
     
@@ -54,13 +63,7 @@ def create_email_preview():
     # Compute Final Status using logic.xlsx
     print("🧠 Computing final status...")
     try:
-        xls_rules = pd.ExcelFile('logic.xlsx')
-        rules_df = pd.read_excel(xls_rules, 'Rules')
-        
-        status_mapping = {}
-        for _, row in rules_df.iterrows():
-            if pd.notna(row['Request Status']) and pd.notna(row['Final Answer']):
-                status_mapping[row['Request Status']] = row['Final Answer']
+        status_mapping = load_status_mapping()
         
         df['Final Status'] = df['Request Status'].map(status_mapping)
         df['Final Status'] = df['Final Status'].fillna(df['Request Status'])
@@ -79,94 +82,77 @@ def create_email_preview():
     os.makedirs(output_dir, exist_ok=True)
     print(f"📁 Created output directory: {output_dir}")
     
+    # Final Status values counted in each summary column
+    status_groups = {
+        'Request Cancelled Out of Stock': ['Out of stock', 'On hold', 'Not permitted'],
+        'Action Pending at HO': ['Action pending / In Process'],
+        'Pending for Invoicing': ['Dispatch Pending'],
+        'Pending for Dispatch': ['Dispatch Pending'],
+        'Delivered': ['Delivered'],
+        'Dispatched In Transit': ['Dispatched & In Transit'],
+        'RTO': ['RTO']
+    }
+    summary_columns = [
+        'Area Name', 'ABM Name', 'Unique TBMs', 'Unique HCPs', 'Unique Requests', 'Requests Raised',
+        'Request Cancelled Out of Stock', 'Action Pending at HO', 'Sent to HUB', 'Pending for Invoicing',
+        'Pending for Dispatch', 'Requests Dispatched', 'Delivered', 'Dispatched In Transit', 'RTO',
+        'Incomplete Address', 'Doctor Non Contactable', 'Doctor Refused to Accept', 'Hold Delivery'
+    ]
+    
     # Process each ZBM
     for _, zbm_row in zbms.iterrows():
         zbm_code = zbm_row['ZBM Terr Code']
         zbm_name = zbm_row['ZBM Name']
         zbm_email = zbm_row['ZBM EMAIL_ID']
         
-        print(f"\n🔄 Processing ZBM: {zbm_code} - {zbm_name}")
+        logger.info("\n🔄 Processing ZBM: %s - %s", zbm_code, zbm_name)
         
         # Filter data for this specific ZBM ONLY
         zbm_data = df[df['ZBM Terr Code'] == zbm_code]
         
         if len(zbm_data) == 0:
-            print(f"⚠️ No data found for ZBM: {zbm_code}")
+            logger.warning("⚠️ No data found for ZBM: %s", zbm_code)
             continue
         
-        print(f"   📊 Found {len(zbm_data)} records for this ZBM")
+        logger.info("   📊 Found %d records for this ZBM", len(zbm_data))
         
         # Get unique ABMs under this ZBM
         abms = zbm_data.groupby(['ABM Terr Code', 'ABM Name', 'ABM EMAIL_ID']).agg({
             'TBM HQ': 'first'
         }).reset_index()
         
-        print(f"   📋 Found {len(abms)} ABMs under this ZBM")
+        logger.info("   📋 Found %d ABMs under this ZBM", len(abms))
+        
+        # Create summary data for email body: one groupby per ZBM instead of per-ABM filtering
+        abm_keys = ['ABM Terr Code', 'ABM Name']
+        request_ids = zbm_data['Assigned Request Ids']
+        status_counts = zbm_data.assign(**{
+            col: request_ids.where(zbm_data['Final Status'].isin(statuses))
+            for col, statuses in status_groups.items()
+        })
+        agg_df = status_counts.groupby(abm_keys).agg(
+            **{'Unique TBMs': ('TBM EMAIL_ID', 'nunique'),
+               'Unique HCPs': ('Doctor: Customer Code', 'nunique'),
+               'Unique Requests': ('Assigned Request Ids', 'nunique')},
+            **{col: (col, 'nunique') for col in status_groups}
+        ).reset_index()
         
-        # Create summary data for email body
-        summary_data = []
+        summary_df = abms[abm_keys + ['TBM HQ']].merge(agg_df, on=abm_keys, how='left')
         
-        for _, abm_row in abms.iterrows():
-            abm_code = abm_row['ABM Terr Code']
-            abm_name = abm_row['ABM Name']
-            abm_email = abm_row['ABM EMAIL_ID']
-            tbm_hq = abm_row['TBM HQ']
-            
-            # Filter data for this specific ABM under this ZBM
-            abm_data = zbm_data[(zbm_data['ABM Terr Code'] == abm_code) & (zbm_data['ABM Name'] == abm_name)]
-            
-            # Calculate metrics
-            unique_tbms = abm_data['TBM EMAIL_ID'].nunique() if 'TBM EMAIL_ID' in abm_data.columns else 0
-            unique_hcps = abm_data['Doctor: Customer Code'].nunique()
-            unique_requests = abm_data['Assigned Request Ids'].nunique()
-            
-            # Status counts
-            request_cancelled_out_of_stock = abm_data[abm_data['Final Status'].isin(['Out of stock', 'On hold', 'Not permitted'])]['Assigned Request Ids'].nunique()
-            action_pending_at_ho = abm_data[abm_data['Final Status'].isin(['Action pending / In Process'])]['Assigned Request Ids'].nunique()
-            pending_for_invoicing = abm_data[abm_data['Final Status'].isin(['Dispatch Pending'])]['Assigned Request Ids'].nunique()
-            pending_for_dispatch = abm_data[abm_data['Final Status'].isin(['Dispatch Pending'])]['Assigned Request Ids'].nunique()
-            delivered = abm_data[abm_data['Final Status'].isin(['Delivered'])]['Assigned Request Ids'].nunique()
-            dispatched_in_transit = abm_data[abm_data['Final Status'].isin(['Dispatched & In Transit'])]['Assigned Request Ids'].nunique()
-            rto = abm_data[abm_data['Final Status'].isin(['RTO'])]['Assigned Request Ids'].nunique()
-            
-            # Calculated fields
-            requests_dispatched = delivered + dispatched_in_transit + rto
-            sent_to_hub = pending_for_invoicing + pending_for_dispatch + requests_dispatched
-            requests_raised = request_cancelled_out_of_stock + action_pending_at_ho + sent_to_hub
-            
-            # RTO reasons
-            incomplete_address = 0
-            doctor_non_contactable = 0
-            doctor_refused_to_accept = 0
-            hold_delivery = 0
-            
-            # Create Area Name
-            area_name = f"{abm_code} and {tbm_hq}"
-            
-            summary_data.append({
-                'Area Name': area_name,
-                'ABM Name': abm_name,
-                'Unique TBMs': unique_tbms,
-                'Unique HCPs': unique_hcps,
-                'Unique Requests': unique_requests,
-                'Requests Raised': requests_raised,
-                'Request Cancelled Out of Stock': request_cancelled_out_of_stock,
-                'Action Pending at HO': action_pending_at_ho,
-                'Sent to HUB': sent_to_hub,
-                'Pending for Invoicing': pending_for_invoicing,
-                'Pending for Dispatch': pending_for_dispatch,
-                'Requests Dispatched': requests_dispatched,
-                'Delivered': delivered,
-                'Dispatched In Transit': dispatched_in_transit,
-                'RTO': rto,
-                'Incomplete Address': incomplete_address,
-                'Doctor Non Contactable': doctor_non_contactable,
-                'Doctor Refused to Accept': doctor_refused_to_accept,
-                'Hold Delivery': hold_delivery
-            })
+        # Calculated fields
+        summary_df['Requests Dispatched'] = summary_df['Delivered'] + summary_df['Dispatched In Transit'] + summary_df['RTO']
+        summary_df['Sent to HUB'] = summary_df['Pending for Invoicing'] + summary_df['Pending for Dispatch'] + summary_df['Requests Dispatched']
+        summary_df['Requests Raised'] = summary_df['Request Cancelled Out of Stock'] + summary_df['Action Pending at HO'] + summary_df['Sent to HUB']
         
-        # Create DataFrame
-        summary_df = pd.DataFrame(summary_data)
+        # RTO reasons (not tracked here) and Area Name; str() on each value (as the f-string did) keeps
+        # a missing TBM HQ as 'nan' text, where astype(str) would leave it missing under pandas 3
+        summary_df = summary_df.assign(**{
+            'Incomplete Address': 0,
+            'Doctor Non Contactable': 0,
+            'Doctor Refused to Accept': 0,
+            'Hold Delivery': 0,
+            'Area Name': summary_df['ABM Terr Code'].astype(object).map(str) + ' and ' + summary_df['TBM HQ'].astype(object).map(str)
+        })[summary_columns]
         
         # Generate email content
         email_content = generate_email_content(zbm_name, zbm_email, abms, summary_df)
@@ -174,7 +160,7 @@ def create_email_preview():
         # Save email preview
         save_email_preview(zbm_code, zbm_name, email_content, summary_df, output_dir)
         
-        print(f"   ✅ Email preview created for {zbm_name}")
+        logger.info("   ✅ Email preview created for %s", zbm_name)
     
     print(f"\n🎉 Successfully created {len(zbms)} email previews in directory: {output_dir}")
     print("📧 Review the email content before sending")
@@ -288,22 +274,21 @@ def create_summary_table_html(summary_df):
 def save_email_preview(zbm_code, zbm_name, email_content, summary_df, output_dir):
     """Save email preview to file"""
     
-    # Create filename
+    # Create filenames
     safe_zbm_name = str(zbm_name).replace(' ', '_').replace('/', '_').replace('\\', '_')
-    filename = f"Email_Preview_{zbm_code}_{safe_zbm_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-    filepath = os.path.join(output_dir, filename)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"Email_Preview_{zbm_code}_{safe_zbm_name}_{timestamp}.txt"
+    excel_filename = f"Summary_Data_{zbm_code}_{safe_zbm_name}_{timestamp}.xlsx"
     
     # Save email content
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(email_content)
+    Path(output_dir, filename).write_text(email_content, encoding='utf-8')
     
     # Also save summary data as Excel for reference
-    excel_filename = f"Summary_Data_{zbm_code}_{safe_zbm_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    excel_filepath = os.path.join(output_dir, excel_filename)
-    summary_df.to_excel(excel_filepath, index=False)
+    summary_df.to_excel(Path(output_dir, excel_filename), index=False)
     
-    print(f"   📧 Email preview saved: {filename}")
-    print(f"   📊 Summary data saved: {excel_filename}")
+    logger.info("   📧 Email preview saved: %s", filename)
+    logger.info("   📊 Summary data saved: %s", excel_filename)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING if '--quiet' in sys.argv else logging.INFO, format='%(message)s', stream=sys.stdout)
     create_email_preview()
\ No newline at end of file
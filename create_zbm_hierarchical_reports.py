@@ -2,14 +2,73 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
 from openpyxl import load_workbook
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+from openpyxl.styles import Font, Alignment
 from copy import copy as copy_style
+import traceback
 import warnings
+from zbm_common import cached_read, normalize, build_rules, EXCEL_ENGINE
 
 # Suppress FutureWarning for groupby operations
 warnings.filterwarnings('ignore', category=FutureWarning, module='pandas')
 
+# Set ZBM_DEBUG=1 to print the ZBM-ABM mapping, template headers and every written value
+DEBUG = os.environ.get('ZBM_DEBUG') == '1'
+
+# Shared report formatting, created once instead of per cell
+INT_FORMAT = '0'
+TOTAL_FONT = Font(bold=True, name='Arial', size=10)
+TOTAL_ALIGNMENT = Alignment(horizontal='center', vertical='center')
+
+# Numba is optional; without it the status bitmasks are built with numpy's bitwise_or.at
+try:
+    from numba import njit, prange, get_num_threads
+except ImportError:
+    njit = None
+    prange = range
+
+# Trackers with at least this many rows build the bitmasks on all cores
+PARALLEL_MASK_MIN_ROWS = 1_000_000
+
+def _fill_status_masks_loop(request_codes, status_codes, masks):
+    """OR each row's status bit into its request's uint64 mask in one linear pass"""
+    for i in range(request_codes.shape[0]):
+        masks[request_codes[i]] |= np.uint64(1) << np.uint64(status_codes[i])
+
+def _fill_status_masks_chunked(request_codes, status_codes, masks, n_chunks):
+    """Parallel version: each chunk of rows fills its own masks, which are then OR-ed together
+    (threads never write the same mask, so no updates are lost)"""
+    n_rows = request_codes.shape[0]
+    chunk_size = (n_rows + n_chunks - 1) // n_chunks
+    partial = np.zeros((n_chunks, masks.shape[0]), dtype=np.uint64)
+    for c in prange(n_chunks):
+        for i in range(c * chunk_size, min(n_rows, (c + 1) * chunk_size)):
+            partial[c, request_codes[i]] |= np.uint64(1) << np.uint64(status_codes[i])
+    for r in prange(masks.shape[0]):
+        combined = masks[r]
+        for c in range(n_chunks):
+            combined |= partial[c, r]
+        masks[r] = combined
+
+_fill_status_masks_jit = njit(cache=True)(_fill_status_masks_loop) if njit is not None else None
+_fill_status_masks_parallel = njit(cache=True, parallel=True)(_fill_status_masks_chunked) if njit is not None else None
+
+def fill_status_masks(request_codes, status_codes, masks):
+    """Fill the per-request uint64 bitmask of statuses seen"""
+    if _fill_status_masks_jit is not None:
+        if request_codes.shape[0] >= PARALLEL_MASK_MIN_ROWS and get_num_threads() > 1:
+            _fill_status_masks_parallel(request_codes, status_codes, masks, get_num_threads())
+        else:
+            _fill_status_masks_jit(request_codes, status_codes, masks)
+    else:
+        np.bitwise_or.at(masks, request_codes, np.left_shift(np.uint64(1), status_codes.astype(np.uint64)))
+
+def read_master_tracker(path, columns):
+    """Read the given columns of the master tracker as text"""
+    return pd.read_excel(path, usecols=lambda c: c in columns, dtype='string', engine=EXCEL_ENGINE)
+
 def create_zbm_hierarchical_reports():
     """
     Create separate ZBM reports showing ABM hierarchy with perfect tallies
@@ -18,10 +77,18 @@ def create_zbm_hierarchical_reports():
     
     print("🔄 Starting ZBM Hierarchical Reports Creation...")
     
-    # Read master tracker data from Excel file
+    # Required columns (ABM HQ is optional and used for Area Name when present)
+    required_columns = ['ZBM Terr Code', 'ZBM Name', 'ZBM EMAIL_ID',
+                        'ABM Terr Code', 'ABM Name', 'ABM EMAIL_ID',
+                        'TBM HQ', 'TBM EMAIL_ID',
+                        'Doctor: Customer Code', 'Assigned Request Ids', 'Request Status', 'Rto Reason']
+    load_columns = set(required_columns + ['ABM HQ'])
+    
+    # Read master tracker data from Excel file (only the columns used, all as text)
     print("📖 Reading Sample Master Tracker.xlsx...")
     try:
-        df = pd.read_excel('Sample Master Tracker.xlsx')
+        # Cached as Parquet between runs when pyarrow is installed
+        df = cached_read(read_master_tracker, 'Sample Master Tracker.xlsx', 'master', columns=sorted(load_columns))
         print(f"✅ Successfully loaded {len(df)} records from Sample Master Tracker.xlsx")
     except Exception as e:
         print(f"❌ Error reading Sample Master Tracker.xlsx: {e}")
@@ -34,76 +101,158 @@ def create_zbm_hierarchical_reports():
     print("🧹 Cleaning and preparing data...")
     
     # Ensure required columns exist
-    required_columns = ['ZBM Terr Code', 'ZBM Name', 'ZBM EMAIL_ID',
-                        'ABM Terr Code', 'ABM Name', 'ABM EMAIL_ID',
-                        'TBM HQ', 'TBM EMAIL_ID',
-                        'Doctor: Customer Code', 'Assigned Request Ids', 'Request Status', 'Rto Reason']
     missing = [c for c in required_columns if c not in df.columns]
     if missing:
         print(f"❌ Missing required columns in Sample Master Tracker.xlsx: {missing}")
         return
 
-    # Remove rows where key fields are null or empty
-    df = df.dropna(subset=['ZBM Terr Code', 'ZBM Name', 'ABM Terr Code', 'ABM Name', 'TBM HQ'])
-    df = df[df['ZBM Terr Code'].astype(str).str.strip() != '']
-    df = df[df['ABM Terr Code'].astype(str).str.strip() != '']
-    df = df[df['TBM HQ'].astype(str).str.strip() != '']
-
-    # Filter for ZBM codes that start with "ZN" (only restriction needed)
-    df = df[df['ZBM Terr Code'].astype(str).str.startswith('ZN')]
+    # Remove rows where key fields are null or empty, and keep ZBM codes that start
+    # with "ZN" (only restriction needed) - one combined mask, one filtered copy
+    keep = df[['ZBM Terr Code', 'ZBM Name', 'ABM Terr Code', 'ABM Name', 'TBM HQ']].notna().all(axis=1)
+    for col in ['ZBM Terr Code', 'ABM Terr Code', 'TBM HQ']:
+        keep &= df[col].str.strip().ne('').fillna(False)
+    keep &= df['ZBM Terr Code'].str.startswith('ZN', na=False)
+    df = df.loc[keep].copy()
     print(f"📊 After cleaning and ZBM filtering: {len(df)} records remaining")
     print(f"📊 Processing all ZBM codes starting with 'ZN' - no geographic restrictions")
 
     # Compute Final Answer per unique request id using rules from logic.xlsx
     print("🧠 Computing final status per unique Request Id using rules...")
     try:
-        xls_rules = pd.ExcelFile('logic.xlsx')
-        sheet2 = pd.read_excel(xls_rules, 'Sheet2')
+        # Sheet2 rules from logic.xlsx, keyed by the frozenset of normalized statuses
+        rules = build_rules({})
 
-        def normalize(text):
-            return str(text).strip().casefold()
+        # Normalize each distinct Request Status once and keep the result categorical
+        # (missing statuses become '' so they can never match a rule)
+        request_status = df['Request Status'].fillna('').astype('category')
+        normalized_status = {status: normalize(status) for status in request_status.cat.categories}
+        df['Request Status Norm'] = request_status.map(normalized_status).astype('category')
 
-        rules = {}
-        for _, row in sheet2.iterrows():
-            statuses = [normalize(s) for s in row.drop('Final Answer').dropna().tolist()]
-            statuses = tuple(sorted(set(statuses)))
-            rules[statuses] = row['Final Answer']
+        status_codes = {status: code for code, status in enumerate(df['Request Status Norm'].cat.categories)}
+        request_codes, request_ids = pd.factorize(df['Assigned Request Ids'])
+        valid = request_codes >= 0
+        grouped = pd.DataFrame({'Assigned Request Ids': request_ids})
 
-        # Group statuses by request id from master data
-        grouped = df.groupby('Assigned Request Ids')['Request Status'].apply(list).reset_index()
+        if len(status_codes) <= 64:
+            # Key each rule by the bitmask of its normalized statuses; rules using a status
+            # that never occurs in the data cannot match and are skipped
+            rule_masks = {}
+            for rule_statuses, answer in rules.items():
+                codes = [status_codes.get(status) for status in rule_statuses]
+                if None not in codes:
+                    rule_masks[sum(1 << code for code in codes)] = answer
 
-        def get_final_answer(status_list):
-            key = tuple(sorted(set(normalize(s) for s in status_list)))
-            return rules.get(key, '❌ No matching rule')
+            # Accumulate the bitmask of statuses seen for each request id
+            request_masks = np.zeros(len(request_ids), dtype=np.uint64)
+            fill_status_masks(request_codes[valid].astype(np.int32),
+                              df['Request Status Norm'].cat.codes.to_numpy()[valid].astype(np.int8),
+                              request_masks)
 
-        grouped['Request Status'] = grouped['Request Status'].apply(lambda lst: sorted(set(lst), key=str))
-        grouped['Final Answer'] = grouped['Request Status'].apply(get_final_answer)
-
-        def has_action_pending(status_list):
-            target = 'action pending / in process'
-            return any(normalize(s) == target for s in status_list)
-        grouped['Has D Pending'] = grouped['Request Status'].apply(has_action_pending)
+            if len(status_codes) <= 20:
+                # Flat lookup table indexed by mask -> Final Answer code; -1 picks the trailing no-match entry
+                answers = list(dict.fromkeys(rule_masks.values())) + ['❌ No matching rule']
+                rules_lut = np.full(1 << len(status_codes), -1, dtype=np.int16)
+                for mask, answer in rule_masks.items():
+                    rules_lut[mask] = answers.index(answer)
+                grouped['Final Answer'] = np.array(answers, dtype=object)[rules_lut[request_masks.astype(np.intp)]]
+            else:
+                grouped['Final Answer'] = pd.Series(request_masks).map(rule_masks).fillna('❌ No matching rule')
+        else:
+            # Too many distinct statuses for uint64 bitmasks: key each request by the frozenset
+            # of its normalized statuses and look it up in the rules directly
+            status_sets = (pd.Series(df['Request Status Norm'].to_numpy()[valid], index=request_codes[valid])
+                           .groupby(level=0).agg(frozenset))
+            grouped['Final Answer'] = [rules.get(statuses, '❌ No matching rule') for statuses in status_sets]
 
-        # Merge Final Answer back to main dataframe
-        df = df.merge(grouped[['Assigned Request Ids', 'Final Answer', 'Has D Pending']], on='Assigned Request Ids', how='left')
+        # Map Final Answer back to each row by its request code instead of a merge join
+        # (code -1, a missing request id, gets no Final Answer as before)
+        df['Final Answer'] = pd.api.extensions.take(grouped['Final Answer'].to_numpy(), request_codes, allow_fill=True)
+        df['Request Code'] = request_codes
     except Exception as e:
         print(f"❌ Error computing final status from logic.xlsx: {e}")
         return
     
     # Get unique ZBMs
+    # Grouping keys as categoricals, so groupbys hash small integer codes instead of strings
+    for col in ['ZBM Terr Code', 'ABM Terr Code', 'ABM Name']:
+        df[col] = df[col].astype('category')
     zbms = df[['ZBM Terr Code', 'ZBM Name', 'ZBM EMAIL_ID']].drop_duplicates().sort_values('ZBM Terr Code')
     print(f"📋 Found {len(zbms)} unique ZBMs")
     
     # Debug: Show all ZBMs and their ABMs
-    print("\n🔍 ZBM-ABM Mapping:")
-    for _, zbm_row in zbms.iterrows():
-        zbm_code = zbm_row['ZBM Terr Code']
-        zbm_name = zbm_row['ZBM Name']
-        zbm_data_temp = df[df['ZBM Terr Code'] == zbm_code]
-        abms_temp = zbm_data_temp[['ABM Terr Code', 'ABM Name']].drop_duplicates()
-        print(f"   {zbm_code} ({zbm_name}): {len(abms_temp)} ABMs")
-        for _, abm_row in abms_temp.iterrows():
-            print(f"      - {abm_row['ABM Terr Code']}: {abm_row['ABM Name']}")
+    if DEBUG:
+        print("\n🔍 ZBM-ABM Mapping:")
+        abm_mapping = df[['ZBM Terr Code', 'ABM Terr Code', 'ABM Name']].drop_duplicates()
+        abms_by_zbm = dict(tuple(abm_mapping.groupby('ZBM Terr Code', observed=True, sort=False)))
+        for zbm_code, zbm_name in zbms[['ZBM Terr Code', 'ZBM Name']].itertuples(index=False):
+            abms_temp = abms_by_zbm[zbm_code]
+            print(f"   {zbm_code} ({zbm_name}): {len(abms_temp)} ABMs")
+            for abm_code, abm_name in abms_temp[['ABM Terr Code', 'ABM Name']].itertuples(index=False):
+                print(f"      - {abm_code}: {abm_name}")
+    
+    # Calculate metrics for every ABM in one pass, keyed by ZBM and ABM
+    print("📊 Calculating ABM metrics...")
+    abm_keys = ['ZBM Terr Code', 'ABM Terr Code', 'ABM Name']
+    # Request ids as their integer codes (NaN where missing) - nunique then hashes numbers, not strings
+    request_ids = df['Request Code'].where(df['Request Code'] >= 0)
+    
+    # Final Answer categories counted per ABM
+    status_groups = {
+        'Request Cancelled Out of Stock': ['Out of stock', 'On hold', 'Not permitted'],  # HO Section (A + B)
+        'Action Pending at HO': ['Request Raised', 'Action pending / In Process At HO'],
+        'Pending for Invoicing': ['Action pending / In Process At Hub'],  # HUB Section (D + E)
+        'Pending for Dispatch': ['Dispatch  Pending'],
+        'Delivered': ['Delivered'],  # Delivery Status (G + H)
+        'Dispatched In Transit': ['Dispatched & In Transit']
+    }
+    
+    # RTO Reasons are based on Rto Reason field, not Final Answer
+    rto_reasons = {
+        'Incomplete Address': 'Incomplete Address',
+        'Doctor Non Contactable': 'Dr. Non contactable',
+        'Doctor Refused to Accept': 'Doctor Refused to Accept'
+    }
+    
+    # One condition column per category holding the request id only where the row qualifies,
+    # so a single groupby counts every category with nunique
+    condition_columns = {col: request_ids.where(df['Final Answer'].isin(answers)) for col, answers in status_groups.items()}
+    
+    # Rto Reason has only a handful of distinct values: match the reasons against those and
+    # expand to rows by code, rather than running each regex over every row
+    rto_codes, rto_values = pd.factorize(df['Rto Reason'])
+    rto_values = pd.Series(rto_values, dtype='string')
+    for col, reason in rto_reasons.items():
+        matched = np.append(rto_values.str.contains(reason, case=False).to_numpy(dtype=bool), False)
+        condition_columns[col] = request_ids.where(matched[rto_codes])  # code -1 (no reason) picks the trailing False
+    abm_summary = df.assign(**condition_columns).groupby(abm_keys, observed=True, sort=False).agg(
+        **{'Unique TBMs': ('TBM EMAIL_ID', 'nunique'),
+           'Unique HCPs': ('Doctor: Customer Code', 'nunique')},
+        **{col: (col, 'nunique') for col in condition_columns}
+    )
+    
+    # Calculate RTO as sum of RTO reasons, then the calculated fields using the RTO total
+    abm_summary['RTO'] = abm_summary[list(rto_reasons)].sum(axis=1)
+    abm_summary['Requests Dispatched'] = abm_summary['Delivered'] + abm_summary['Dispatched In Transit'] + abm_summary['RTO']  # F = G + H + I
+    abm_summary['Sent to HUB'] = abm_summary['Pending for Invoicing'] + abm_summary['Pending for Dispatch'] + abm_summary['Requests Dispatched']  # C = D + E + F
+    abm_summary['Requests Raised'] = abm_summary['Request Cancelled Out of Stock'] + abm_summary['Action Pending at HO'] + abm_summary['Sent to HUB']  # A + B + C
+    abm_summary['Hold Delivery'] = 0
+    
+    summary_columns = [
+        'Area Name', 'ABM Name', 'Unique TBMs', 'Unique HCPs', 'Requests Raised',
+        'Request Cancelled Out of Stock', 'Action Pending at HO', 'Sent to HUB',
+        'Pending for Invoicing', 'Pending for Dispatch', 'Requests Dispatched',
+        'Delivered', 'Dispatched In Transit', 'RTO', 'Incomplete Address',
+        'Doctor Non Contactable', 'Doctor Refused to Accept', 'Hold Delivery'
+    ]
+    
+    # Load the report template once; every ZBM workbook is re-opened from these bytes
+    try:
+        with open('zbm_summary.xlsx', 'rb') as f:
+            template_bytes = f.read()
+        template_layout = read_template_layout(load_workbook(BytesIO(template_bytes))['ZBM'])
+    except Exception as e:
+        print(f"❌ Error reading template zbm_summary.xlsx: {e}")
+        return
     
     # Create output directory
     timestamp = datetime.now().strftime('%Y%m%d')
@@ -111,308 +260,259 @@ def create_zbm_hierarchical_reports():
     os.makedirs(output_dir, exist_ok=True)
     print(f"📁 Created output directory: {output_dir}")
     
+    # ZBM name and email looked up by code
+    zbm_meta = zbms.drop_duplicates('ZBM Terr Code').set_index('ZBM Terr Code')
+    
+    # ABM details (first non-null value per column) for every ZBM at once, indexed and sorted
+    # like abm_summary; a tracker without ABM HQ gets an all-missing column
+    abm_detail_columns = ['ABM EMAIL_ID', 'TBM HQ', 'ABM HQ']
+    abm_meta = (df.groupby(abm_keys, observed=True)[[col for col in abm_detail_columns if col in df.columns]]
+                .first()
+                .reindex(columns=abm_detail_columns))
+    
+    # Report rows for every ABM at once: details joined with metrics, Area Name (ABM HQ,
+    # falling back to TBM HQ) built column-wise, indexed by ZBM only
+    abm_report = abm_meta.join(abm_summary).reset_index(level=['ABM Terr Code', 'ABM Name'])
+    abm_hq = abm_report['ABM HQ'].fillna(abm_report['TBM HQ'])
+    abm_report['Area Name'] = abm_report['ABM Terr Code'].astype(str) + ' - ' + abm_hq.astype(str)
+    abm_report = abm_report[summary_columns]
+    
     # Process each ZBM
-    for _, zbm_row in zbms.iterrows():
-        zbm_code = zbm_row['ZBM Terr Code']
-        zbm_name = zbm_row['ZBM Name']
-        zbm_email = zbm_row['ZBM EMAIL_ID']
-        
+    report_tasks = []
+    for zbm_code, zbm_name, zbm_email in zbm_meta[['ZBM Name', 'ZBM EMAIL_ID']].itertuples():
         print(f"\n🔄 Processing ZBM: {zbm_code} - {zbm_name}")
         
-        # Filter data for this ZBM
-        zbm_data = df[df['ZBM Terr Code'] == zbm_code].copy()
-        
-        if len(zbm_data) == 0:
-            print(f"⚠️ No data found for ZBM: {zbm_code}")
-            continue
+        # This ZBM's slice of the precomputed report rows
+        zbm_summary_df = abm_report.loc[[zbm_code]].reset_index(drop=True)
+        print(f"   📊 Found {len(zbm_summary_df)} ABMs under this ZBM")
         
-        # Get unique ABMs under this ZBM
-        abms = zbm_data.groupby(['ABM Terr Code', 'ABM Name']).agg({
-            'ABM EMAIL_ID': 'first',
-            'TBM HQ': 'first',
-            'ABM HQ': 'first' if 'ABM HQ' in zbm_data.columns else lambda x: None
-        }).reset_index()
-        
-        abms = abms.sort_values('ABM Terr Code')
-        print(f"   📊 Found {len(abms)} ABMs under this ZBM")
-        
-        # Create summary data for this ZBM
-        summary_data = []
-        
-        for _, abm_row in abms.iterrows():
-            abm_code = abm_row['ABM Terr Code']
-            abm_name = abm_row['ABM Name']
-            abm_email = abm_row['ABM EMAIL_ID']
-            tbm_hq = abm_row['TBM HQ']
-            
-            # Filter data for this specific ABM
-            abm_data = zbm_data[(zbm_data['ABM Terr Code'] == abm_code) & (zbm_data['ABM Name'] == abm_name)]
-            
-            print(f"      Processing {abm_name} ({abm_code}): {len(abm_data)} records")
-            
-            # Calculate metrics for this ABM
-            unique_tbms = abm_data['TBM EMAIL_ID'].nunique() if 'TBM EMAIL_ID' in abm_data.columns else 0
-            unique_hcps = abm_data['Doctor: Customer Code'].nunique()
-            unique_requests = abm_data['Assigned Request Ids'].nunique()
-            
-            # HO Section (A + B) - Using Final Answer instead of Request Status
-            # Count unique request IDs for each status category
-            request_cancelled_out_of_stock = abm_data[abm_data['Final Answer'].isin(['Out of stock', 'On hold', 'Not permitted'])]['Assigned Request Ids'].nunique()
-            action_pending_at_ho = abm_data[abm_data['Final Answer'].isin(['Request Raised', 'Action pending / In Process At HO'])]['Assigned Request Ids'].nunique()
-            
-            # HUB Section (D + E) - Using Final Answer instead of Request Status
-            pending_for_invoicing = abm_data[abm_data['Final Answer'].isin(['Action pending / In Process At Hub'])]['Assigned Request Ids'].nunique()
-            pending_for_dispatch = abm_data[abm_data['Final Answer'].isin(['Dispatch  Pending'])]['Assigned Request Ids'].nunique()
-            
-            # Delivery Status (G + H) - Using Final Answer instead of Request Status
-            delivered = abm_data[abm_data['Final Answer'].isin(['Delivered'])]['Assigned Request Ids'].nunique()
-            dispatched_in_transit = abm_data[abm_data['Final Answer'].isin(['Dispatched & In Transit'])]['Assigned Request Ids'].nunique()
-            
-            # RTO Reasons - Calculate FIRST before using in formulas
-            # Note: RTO reasons are based on Rto Reason field, not Final Answer
-            # Count unique request IDs for each RTO reason
-            incomplete_address = abm_data[abm_data['Rto Reason'].str.contains('Incomplete Address', na=False, case=False)]['Assigned Request Ids'].nunique()
-            doctor_non_contactable = abm_data[abm_data['Rto Reason'].str.contains('Dr. Non contactable', na=False, case=False)]['Assigned Request Ids'].nunique()
-            doctor_refused_to_accept = abm_data[abm_data['Rto Reason'].str.contains('Doctor Refused to Accept', na=False, case=False)]['Assigned Request Ids'].nunique()
-            
-            # Calculate RTO as sum of RTO reasons
-            rto_total = incomplete_address + doctor_non_contactable + doctor_refused_to_accept
-            
-            # Calculated fields using the RTO total
-            requests_dispatched = delivered + dispatched_in_transit + rto_total  # F = G + H + I
-            sent_to_hub = pending_for_invoicing + pending_for_dispatch + requests_dispatched  # C = D + E + F
-            requests_raised = request_cancelled_out_of_stock + action_pending_at_ho + sent_to_hub  # A + B + C
-            hold_delivery = 0
-            
-            # Create Area Name
-            if 'ABM HQ' in abm_row and pd.notna(abm_row['ABM HQ']):
-                abm_hq = abm_row['ABM HQ']
-            else:
-                abm_hq = tbm_hq
-            area_name = f"{abm_code} - {abm_hq}"
-            
-            summary_data.append({
-                'Area Name': area_name,
-                'ABM Name': abm_name,
-                'Unique TBMs': unique_tbms,
-                'Unique HCPs': unique_hcps,
-                'Requests Raised': requests_raised,
-                'Request Cancelled Out of Stock': request_cancelled_out_of_stock,
-                'Action Pending at HO': action_pending_at_ho,
-                'Sent to HUB': sent_to_hub,
-                'Pending for Invoicing': pending_for_invoicing,
-                'Pending for Dispatch': pending_for_dispatch,
-                'Requests Dispatched': requests_dispatched,
-                'Delivered': delivered,
-                'Dispatched In Transit': dispatched_in_transit,
-                'RTO': rto_total,  # Use rto_total instead of rto
-                'Incomplete Address': incomplete_address,
-                'Doctor Non Contactable': doctor_non_contactable,
-                'Doctor Refused to Accept': doctor_refused_to_accept,
-                'Hold Delivery': hold_delivery
-            })
-        
-        # Create DataFrame for this ZBM
-        zbm_summary_df = pd.DataFrame(summary_data)
-        
-        # Create Excel file for this ZBM
-        create_zbm_excel_report(zbm_code, zbm_name, zbm_email, zbm_summary_df, output_dir)
+        # Queue the Excel file for this ZBM
+        report_tasks.append((zbm_code, zbm_name, zbm_email, zbm_summary_df, output_dir, template_bytes, template_layout))
+    
+    # Create the Excel files in parallel - each ZBM workbook is independent
+    print(f"\n📝 Writing {len(report_tasks)} ZBM reports...")
+    if len(report_tasks) > 1 and (os.cpu_count() or 1) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+                list(executor.map(create_zbm_excel_report, *zip(*report_tasks)))
+            report_tasks = []
+        except Exception as e:
+            print(f"⚠️ Parallel report writing failed ({e}), writing reports one by one")
+    for task in report_tasks:
+        create_zbm_excel_report(*task)
     
     print(f"\n🎉 Successfully created {len(zbms)} ZBM reports in directory: {output_dir}")
 
-def create_zbm_excel_report(zbm_code, zbm_name, zbm_email, summary_df, output_dir):
+def read_template_layout(ws):
+    """Find the header row and map template headers to summary columns"""
+    
+    # Index every merged cell to its range's top-left value once, instead of
+    # scanning all merged ranges for each cell looked up
+    merged_values = {}
+    for merged_range in ws.merged_cells.ranges:
+        top_left_value = ws.cell(row=merged_range.min_row, column=merged_range.min_col).value
+        for row_idx in range(merged_range.min_row, merged_range.max_row + 1):
+            for col_idx in range(merged_range.min_col, merged_range.max_col + 1):
+                merged_values[(row_idx, col_idx)] = top_left_value
+    
+    def get_cell_value_handling_merged(row, col):
+        """Get cell value even if it's part of a merged cell"""
+        if (row, col) in merged_values:
+            return merged_values[(row, col)]
+        return ws.cell(row=row, column=col).value
+    
+    # Search for header row
+    header_row = None
+    for row_idx in range(1, 15):  # Check first 15 rows
+        for col_idx in range(1, min(30, ws.max_column + 1)):  # Check first 30 columns
+            cell_value = get_cell_value_handling_merged(row_idx, col_idx)
+            if cell_value and 'Area Name' in str(cell_value):
+                header_row = row_idx
+                break
+        if header_row:
+            break
+    
+    if header_row is None:
+        print(f"   ⚠️ Could not find header row in template, using row 7 as default")
+        header_row = 7
+    
+    print(f"   ℹ️ Detected header row: {header_row}")
+    
+    # Read actual column positions from template header row, handling merged cells
+    column_mapping = {}
+    for col_idx in range(1, min(30, ws.max_column + 1)):
+        header_val = get_cell_value_handling_merged(header_row, col_idx)
+        if header_val:
+            header_str = str(header_val).strip()
+    
+            # Map template headers to our data columns
+            if 'Area Name' in header_str:
+                column_mapping['Area Name'] = col_idx
+            elif 'ABM Name' in header_str:
+                column_mapping['ABM Name'] = col_idx
+            elif 'Unique TBMs' in header_str or '# Unique TBMs' in header_str:
+                column_mapping['Unique TBMs'] = col_idx
+            elif 'Unique HCPs' in header_str or '# Unique HCPs' in header_str:
+                column_mapping['Unique HCPs'] = col_idx
+            elif 'Requests Raised' in header_str or '# Requests Raised' in header_str:
+                column_mapping['Requests Raised'] = col_idx
+            elif 'Request Cancelled' in header_str or 'Out of Stock' in header_str:
+                column_mapping['Request Cancelled Out of Stock'] = col_idx
+            elif 'Action pending' in header_str and 'HO' in header_str:
+                column_mapping['Action Pending at HO'] = col_idx
+            elif 'Sent to HUB' in header_str:
+                column_mapping['Sent to HUB'] = col_idx
+            elif 'Pending for Invoicing' in header_str:
+                column_mapping['Pending for Invoicing'] = col_idx
+            elif 'Pending for Dispatch' in header_str:
+                column_mapping['Pending for Dispatch'] = col_idx
+            elif 'Requests Dispatched' in header_str or '# Requests Dispatched' in header_str:
+                column_mapping['Requests Dispatched'] = col_idx
+            elif header_str == 'Delivered' or 'Delivered (G)' in header_str:
+                column_mapping['Delivered'] = col_idx
+            elif 'Dispatched & In Transit' in header_str or 'Dispatched In Transit' in header_str:
+                column_mapping['Dispatched In Transit'] = col_idx
+            elif header_str == 'RTO' or 'RTO (I)' in header_str:
+                column_mapping['RTO'] = col_idx
+            elif 'Incomplete Address' in header_str:
+                column_mapping['Incomplete Address'] = col_idx
+            elif 'Doctor Non Contactable' in header_str or 'Dr. Non contactable' in header_str:
+                column_mapping['Doctor Non Contactable'] = col_idx
+            elif 'Doctor Refused' in header_str or 'Refused to Accept' in header_str:
+                column_mapping['Doctor Refused to Accept'] = col_idx
+            elif 'Hold Delivery' in header_str:
+                column_mapping['Hold Delivery'] = col_idx
+    
+    print(f"   ℹ️ Detected {len(column_mapping)} columns: {list(column_mapping.keys())}")
+    
+    # Verify we have the essential columns
+    essential_cols = ['Area Name', 'ABM Name', 'Unique TBMs', 'Unique HCPs', 'Requests Raised']
+    missing_essential = [col for col in essential_cols if col not in column_mapping]
+    if missing_essential:
+        print(f"   ⚠️ WARNING: Missing essential columns in template: {missing_essential}")
+    
+    # Debug: Print all headers with their values from template
+    if DEBUG:
+        print(f"   🔍 Template headers found:")
+        for col_idx in range(1, min(30, ws.max_column + 1)):
+            val = get_cell_value_handling_merged(header_row, col_idx)
+            if val:
+                print(f"      Column {col_idx}: '{val}'")
+    
+    return header_row, column_mapping
+
+def create_zbm_excel_report(zbm_code, zbm_name, zbm_email, summary_df, output_dir, template_bytes=None, template_layout=None):
     """Create Excel report for a specific ZBM with perfect formatting"""
     
     try:
-        # Load template
-        wb = load_workbook('zbm_summary.xlsx')
+        # Load template (from the caller's in-memory copy when given)
+        wb = load_workbook(BytesIO(template_bytes) if template_bytes is not None else 'zbm_summary.xlsx')
         ws = wb['ZBM']
 
         print(f"   📋 Creating Excel report for {zbm_code}...")
 
-        def get_cell_value_handling_merged(row, col):
-            """Get cell value even if it's part of a merged cell"""
-            cell = ws.cell(row=row, column=col)
-            
-            # Check if this cell is part of a merged range
-            for merged_range in ws.merged_cells.ranges:
-                if cell.coordinate in merged_range:
-                    # Get the top-left cell of the merged range
-                    top_left_cell = ws.cell(row=merged_range.min_row, column=merged_range.min_col)
-                    return top_left_cell.value
-            
-            return cell.value
-        
-        # Search for header row
-        header_row = None
-        for row_idx in range(1, 15):  # Check first 15 rows
-            for col_idx in range(1, min(30, ws.max_column + 1)):  # Check first 30 columns
-                cell_value = get_cell_value_handling_merged(row_idx, col_idx)
-                if cell_value and 'Area Name' in str(cell_value):
-                    header_row = row_idx
-                    break
-            if header_row:
-                break
-        
-        if header_row is None:
-            print(f"   ⚠️ Could not find header row in template, using row 7 as default")
-            header_row = 7
-        
-        print(f"   ℹ️ Detected header row: {header_row}")
+        # Header row and column positions (detected once by the caller when given)
+        if template_layout is None:
+            template_layout = read_template_layout(ws)
+        header_row, column_mapping = template_layout
         data_start_row = header_row + 1
         
-        # Read actual column positions from template header row, handling merged cells
-        column_mapping = {}
-        for col_idx in range(1, min(30, ws.max_column + 1)):
-            header_val = get_cell_value_handling_merged(header_row, col_idx)
-            if header_val:
-                header_str = str(header_val).strip()
-                
-                # Map template headers to our data columns
-                if 'Area Name' in header_str:
-                    column_mapping['Area Name'] = col_idx
-                elif 'ABM Name' in header_str:
-                    column_mapping['ABM Name'] = col_idx
-                elif 'Unique TBMs' in header_str or '# Unique TBMs' in header_str:
-                    column_mapping['Unique TBMs'] = col_idx
-                elif 'Unique HCPs' in header_str or '# Unique HCPs' in header_str:
-                    column_mapping['Unique HCPs'] = col_idx
-                elif 'Requests Raised' in header_str or '# Requests Raised' in header_str:
-                    column_mapping['Requests Raised'] = col_idx
-                elif 'Request Cancelled' in header_str or 'Out of Stock' in header_str:
-                    column_mapping['Request Cancelled Out of Stock'] = col_idx
-                elif 'Action pending' in header_str and 'HO' in header_str:
-                    column_mapping['Action Pending at HO'] = col_idx
-                elif 'Sent to HUB' in header_str:
-                    column_mapping['Sent to HUB'] = col_idx
-                elif 'Pending for Invoicing' in header_str:
-                    column_mapping['Pending for Invoicing'] = col_idx
-                elif 'Pending for Dispatch' in header_str:
-                    column_mapping['Pending for Dispatch'] = col_idx
-                elif 'Requests Dispatched' in header_str or '# Requests Dispatched' in header_str:
-                    column_mapping['Requests Dispatched'] = col_idx
-                elif header_str == 'Delivered' or 'Delivered (G)' in header_str:
-                    column_mapping['Delivered'] = col_idx
-                elif 'Dispatched & In Transit' in header_str or 'Dispatched In Transit' in header_str:
-                    column_mapping['Dispatched In Transit'] = col_idx
-                elif header_str == 'RTO' or 'RTO (I)' in header_str:
-                    column_mapping['RTO'] = col_idx
-                elif 'Incomplete Address' in header_str:
-                    column_mapping['Incomplete Address'] = col_idx
-                elif 'Doctor Non Contactable' in header_str or 'Dr. Non contactable' in header_str:
-                    column_mapping['Doctor Non Contactable'] = col_idx
-                elif 'Doctor Refused' in header_str or 'Refused to Accept' in header_str:
-                    column_mapping['Doctor Refused to Accept'] = col_idx
-                elif 'Hold Delivery' in header_str:
-                    column_mapping['Hold Delivery'] = col_idx
-        
-        print(f"   ℹ️ Detected {len(column_mapping)} columns: {list(column_mapping.keys())}")
-        
-        # Verify we have the essential columns
-        essential_cols = ['Area Name', 'ABM Name', 'Unique TBMs', 'Unique HCPs', 'Requests Raised']
-        missing_essential = [col for col in essential_cols if col not in column_mapping]
-        if missing_essential:
-            print(f"   ⚠️ WARNING: Missing essential columns in template: {missing_essential}")
-        
         # Print summary_df to verify data exists
-        print(f"   ℹ️ Summary DataFrame shape: {summary_df.shape}")
-        print(f"   ℹ️ Summary DataFrame columns: {list(summary_df.columns)}")
+        if DEBUG:
+            print(f"   ℹ️ Summary DataFrame shape: {summary_df.shape}")
+            print(f"   ℹ️ Summary DataFrame columns: {list(summary_df.columns)}")
         if len(summary_df) > 0:
-            print(f"   ℹ️ First row sample: Area={summary_df.iloc[0]['Area Name']}, ABM={summary_df.iloc[0]['ABM Name']}, TBMs={summary_df.iloc[0]['Unique TBMs']}")
+            if DEBUG:
+                print(f"   ℹ️ First row sample: Area={summary_df.iloc[0]['Area Name']}, ABM={summary_df.iloc[0]['ABM Name']}, TBMs={summary_df.iloc[0]['Unique TBMs']}")
         else:
             print(f"   ⚠️ WARNING: Summary DataFrame is empty!")
             return
         
-        # Debug: Print all headers with their values from template
-        print(f"   🔍 Template headers found:")
-        for col_idx in range(1, min(30, ws.max_column + 1)):
-            val = get_cell_value_handling_merged(header_row, col_idx)
-            if val:
-                print(f"      Column {col_idx}: '{val}'")
-        
         # Clear existing data rows (preserve header)
+        # Only rows the template actually has are visited - rows past ws.max_row hold no
+        # values, and creating empty cells there would just grow the sheet before writing
         max_clear_rows = max(len(summary_df) + 10, 50)
-        for r in range(data_start_row, data_start_row + max_clear_rows):
-            for c in range(1, ws.max_column + 1):
+        clear_end_row = min(data_start_row + max_clear_rows - 1, ws.max_row)
+        for row_cells in ws.iter_rows(min_row=data_start_row, max_row=clear_end_row):
+            for cell in row_cells:
                 try:
-                    cell = ws.cell(row=r, column=c)
                     cell.value = None
                 except:
                     pass
 
-        def copy_row_style(src_row_idx, dst_row_idx):
-            """Copy formatting from source row to destination row"""
-            for c in range(1, ws.max_column + 1):
-                try:
-                    src = ws.cell(row=src_row_idx, column=c)
-                    dst = ws.cell(row=dst_row_idx, column=c)
-                    
-                    if src.font:
-                        dst.font = copy_style(src.font)
-                    if src.alignment:
-                        dst.alignment = copy_style(src.alignment)
-                    if src.border:
-                        dst.border = copy_style(src.border)
-                    if src.fill:
-                        dst.fill = copy_style(src.fill)
-                    dst.number_format = src.number_format
-                except:
-                    pass
-
-        # Write data rows
+        # Capture the template data row's formatting once per column; each target cell gets a
+        # copy of that cell's style array (indices into the workbook's existing style tables),
+        # so no Font/Border/Fill objects are copied per cell and no named styles are added
         template_data_row = data_start_row  # Use first data row as template
-        for i in range(len(summary_df)):
+        row_styles = {c: copy_style(ws.cell(row=template_data_row, column=c)._style)
+                      for c in range(1, ws.max_column + 1)}
+
+        def copy_row_style(dst_row_idx):
+            """Apply the template data row formatting to a destination row"""
+            for c, style in row_styles.items():
+                ws.cell(row=dst_row_idx, column=c)._style = copy_style(style)
+
+        # Write data rows a whole row at a time: take each summary row as a plain tuple and
+        # fill the target row's cells directly (ws.append can't be used because it always
+        # writes below the template's existing rows, not at data_start_row)
+        # Numeric columns are made plain int64 up front so cells need no per-value NaN/type checks
+        numeric_columns = summary_df.select_dtypes('number').columns
+        summary_df = summary_df.fillna({col: 0 for col in numeric_columns}).astype({col: 'int64' for col in numeric_columns})
+        # Mapped columns as parallel lists plus one 2D array of their values, so the loop below
+        # walks plain arrays instead of looking names up per cell
+        ordered_names = [col_name for col_name in column_mapping if col_name in summary_df.columns]
+        ordered_cols = [column_mapping[col_name] for col_name in ordered_names]
+        values2d = summary_df[ordered_names].to_numpy()
+        last_col = max(ws.max_column, *column_mapping.values()) if column_mapping else ws.max_column
+        for i in range(values2d.shape[0]):
             target_row = data_start_row + i
             
             # Copy formatting from template
-            copy_row_style(template_data_row, target_row)
+            copy_row_style(target_row)
+            row_cells = next(ws.iter_rows(min_row=target_row, max_row=target_row, max_col=last_col))
             
-            # Write data to mapped columns
-            for col_name, col_idx in column_mapping.items():
-                if col_name in summary_df.columns:
-                    value = summary_df.iloc[i][col_name]  # Use iloc for safer access
-                    
-                    # Debug print for first row
-                    if i == 0:
-                        print(f"      Writing '{col_name}' = {value} to column {col_idx}")
-                    
-                    try:
-                        cell = ws.cell(row=target_row, column=col_idx)
-                        cell.value = value
-                        
-                        # Apply number formatting for numeric columns
-                        if isinstance(value, (int, float)) and not pd.isna(value):
-                            cell.number_format = '0'
-                    except Exception as e:
-                        print(f"      Warning: Could not write to cell ({target_row}, {col_idx}): {e}")
+            # Write data to mapped columns (data cells keep the template's number format;
+            # only the totals row is set to INT_FORMAT)
+            for col_name, col_idx, value in zip(ordered_names, ordered_cols, values2d[i]):
+                # Debug print for first row
+                if DEBUG and i == 0:
+                    print(f"      Writing '{col_name}' = {value} to column {col_idx}")
+                
+                try:
+                    cell = row_cells[col_idx - 1]
+                    cell.value = value
+                except Exception as e:
+                    print(f"      Warning: Could not write to cell ({target_row}, {col_idx}): {e}")
 
         # Add total row
         total_row = data_start_row + len(summary_df)
-        copy_row_style(template_data_row, total_row)
+        copy_row_style(total_row)
         
         # Write "Total" label in ABM Name column
         if 'ABM Name' in column_mapping:
             try:
                 cell = ws.cell(row=total_row, column=column_mapping['ABM Name'])
                 cell.value = "Total"
-                cell.font = Font(bold=True, name='Arial', size=10)
-                cell.alignment = Alignment(horizontal='center', vertical='center')
+                cell.font = TOTAL_FONT
+                cell.alignment = TOTAL_ALIGNMENT
             except:
                 pass
         
-        # Calculate and write totals
+        # Calculate all column totals in one call, then write them
+        totals = summary_df.drop(columns=['Area Name', 'ABM Name']).sum(numeric_only=True)
         for col_name, col_idx in column_mapping.items():
-            if col_name in summary_df.columns and col_name not in ['Area Name', 'ABM Name']:
-                total_value = int(summary_df[col_name].sum())  # Ensure it's an integer
+            if col_name in totals.index:
+                total_value = int(totals[col_name])  # Ensure it's an integer
                 
-                print(f"      Writing Total '{col_name}' = {total_value} to column {col_idx}")
+                if DEBUG:
+                    print(f"      Writing Total '{col_name}' = {total_value} to column {col_idx}")
                 
                 try:
                     cell = ws.cell(row=total_row, column=col_idx)
                     cell.value = total_value
-                    cell.font = Font(bold=True, name='Arial', size=10)
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-                    cell.number_format = '0'
+                    cell.font = TOTAL_FONT
+                    cell.alignment = TOTAL_ALIGNMENT
+                    cell.number_format = INT_FORMAT
                 except Exception as e:
                     print(f"      Warning: Could not write total to cell ({total_row}, {col_idx}): {e}")
 
@@ -427,15 +527,14 @@ def create_zbm_excel_report(zbm_code, zbm_name, zbm_email, summary_df, output_di
         # Print summary statistics
         print(f"   📊 Summary for {zbm_code}:")
         print(f"      Total ABMs: {len(summary_df)}")
-        print(f"      Total Unique TBMs: {summary_df['Unique TBMs'].sum()}")
-        print(f"      Total Unique HCPs: {summary_df['Unique HCPs'].sum()}")
-        print(f"      Total Requests Raised: {summary_df['Requests Raised'].sum()}")
-        print(f"      Total Delivered: {summary_df['Delivered'].sum()}")
-        print(f"      Total RTO: {summary_df['RTO'].sum()}")
+        print(f"      Total Unique TBMs: {totals['Unique TBMs']}")
+        print(f"      Total Unique HCPs: {totals['Unique HCPs']}")
+        print(f"      Total Requests Raised: {totals['Requests Raised']}")
+        print(f"      Total Delivered: {totals['Delivered']}")
+        print(f"      Total RTO: {totals['RTO']}")
         
     except Exception as e:
         print(f"   ❌ Error creating Excel report for {zbm_code}: {e}")
-        import traceback
         traceback.print_exc()
 
 if __name__ == "__main__":
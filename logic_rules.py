@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Logic Rules Converter
+Converts the status mapping rules in logic.xlsx to logic.json, and caches the
+Sheet2 status-combination rules in logic_rules.json
+Run once after editing logic.xlsx: python logic_rules.py
+"""
+
+import pandas as pd
+import os
+import json
+from functools import lru_cache
+import warnings
+
+# Suppress pandas warnings
+warnings.filterwarnings('ignore', category=FutureWarning, module='pandas')
+
+LOGIC_XLSX = 'logic.xlsx'
+LOGIC_JSON = 'logic.json'
+LOGIC_RULES_JSON = 'logic_rules.json'
+
+# python-calamine is optional; when installed, xlsx files are parsed with its much faster
+# engine instead of openpyxl (engine=None keeps the pandas default). Defined here because
+# zbm_common imports this module; the other scripts import it from zbm_common
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = None
+
+def build_status_mapping(xlsx_path=LOGIC_XLSX):
+    """Read the Request Status -> Final Answer mapping from logic.xlsx"""
+
+    xls_rules = pd.ExcelFile(xlsx_path, engine=EXCEL_ENGINE)
+
+    # Check available sheet names
+    sheet_names = xls_rules.sheet_names
+    print(f"   📋 Available sheets in {xlsx_path}: {sheet_names}")
+
+    # Try to find the rules sheet (case-insensitive), else use the first sheet
+    rules_sheet = next((sheet for sheet in sheet_names if 'rule' in sheet.lower()), sheet_names[0])
+    print(f"   📖 Using sheet: {rules_sheet}")
+    rules_df = pd.read_excel(xls_rules, rules_sheet)
+
+    # Check if required columns exist, else look for alternative column names
+    status_col = 'Request Status' if 'Request Status' in rules_df.columns else None
+    answer_col = 'Final Answer' if 'Final Answer' in rules_df.columns else None
+
+    if status_col is None or answer_col is None:
+        print(f"   📋 Available columns: {list(rules_df.columns)}")
+        for col in rules_df.columns:
+            col_lower = str(col).lower()
+            if status_col is None and 'request' in col_lower and 'status' in col_lower:
+                status_col = col
+            if answer_col is None and 'final' in col_lower and 'answer' in col_lower:
+                answer_col = col
+
+        if not (status_col and answer_col):
+            raise Exception("Cannot find suitable columns for status mapping")
+        print(f"   🔄 Using columns: {status_col} -> {answer_col}")
+
+    rules_df = rules_df[[status_col, answer_col]].dropna()
+    return dict(zip(rules_df[status_col].astype(str), rules_df[answer_col].astype(str)))
+
+def convert_logic_to_json(xlsx_path=LOGIC_XLSX, json_path=LOGIC_JSON):
+    """Write the status mapping from logic.xlsx to logic.json"""
+
+    status_mapping = build_status_mapping(xlsx_path)
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(status_mapping, f, indent=2, ensure_ascii=False)
+
+    print(f"✅ Saved {len(status_mapping)} status rules to {json_path}")
+    return status_mapping
+
+@lru_cache(maxsize=None)
+def _load_status_mapping(json_path):
+    """Read the status mapping from logic.json, regenerating it when logic.xlsx is newer (kept for the rest of the process)"""
+
+    stale = not os.path.exists(json_path) or (
+        os.path.exists(LOGIC_XLSX) and os.path.getmtime(LOGIC_XLSX) > os.path.getmtime(json_path)
+    )
+    if stale:
+        return convert_logic_to_json(LOGIC_XLSX, json_path)
+
+    with open(json_path, encoding='utf-8') as f:
+        return json.load(f)
+
+def load_status_mapping(json_path=LOGIC_JSON):
+    """Return a copy of the status mapping from logic.json, so callers never change the cached one"""
+    return dict(_load_status_mapping(json_path))
+
+def read_rule_rows(xlsx_path=LOGIC_XLSX):
+    """Read the Sheet2 rules from logic.xlsx as (list of Request Statuses, Final Answer) pairs"""
+
+    # Rows without a Final Answer are skipped, so no NaN (invalid JSON) reaches logic_rules.json
+    sheet2 = pd.read_excel(xlsx_path, 'Sheet2', engine=EXCEL_ENGINE).dropna(subset=['Final Answer'])
+    status_rows = sheet2.drop(columns='Final Answer').itertuples(index=False, name=None)
+    return [([status for status in statuses if pd.notna(status)], final_answer)
+            for statuses, final_answer in zip(status_rows, sheet2['Final Answer'])]
+
+def save_rule_rows(xlsx_path=LOGIC_XLSX, json_path=LOGIC_RULES_JSON):
+    """Write the Sheet2 rules from logic.xlsx to logic_rules.json"""
+
+    rule_rows = read_rule_rows(xlsx_path)
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(rule_rows, f, indent=2, ensure_ascii=False)
+
+    print(f"✅ Saved {len(rule_rows)} Sheet2 rules to {json_path}")
+    return rule_rows
+
+def load_rule_rows(json_path=LOGIC_RULES_JSON):
+    """Load the Sheet2 rules from logic_rules.json, regenerating it when logic.xlsx is newer"""
+
+    stale = not os.path.exists(json_path) or (
+        os.path.exists(LOGIC_XLSX) and os.path.getmtime(LOGIC_XLSX) > os.path.getmtime(json_path)
+    )
+    if stale:
+        return save_rule_rows(LOGIC_XLSX, json_path)
+
+    with open(json_path, encoding='utf-8') as f:
+        return [(statuses, final_answer) for statuses, final_answer in json.load(f)]
+
+if __name__ == "__main__":
+    # Each file on its own, so the Sheet2 rules are cached even when logic.xlsx has no
+    # Request Status -> Final Answer mapping sheet
+    try:
+        convert_logic_to_json()
+    except Exception as e:
+        print(f"❌ Error converting {LOGIC_XLSX} to {LOGIC_JSON}: {e}")
+    try:
+        save_rule_rows()
+    except Exception as e:
+        print(f"❌ Error converting {LOGIC_XLSX} to {LOGIC_RULES_JSON}: {e}")
@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import os
+from zbm_common import load_master_tracker, build_rules, compute_final_answers, PAIR_RULES
 
 def create_manager_presentation_demo():
     """
@@ -12,102 +13,25 @@ def create_manager_presentation_demo():
     print("🎯 MANAGER PRESENTATION DEMO & VALIDATION")
     print("=" * 60)
     
-    # Read master tracker data
-    print("📖 Reading master_tracker.csv...")
-    try:
-        df = pd.read_csv('master_tracker.csv', encoding='latin-1', low_memory=False)
-        print(f"✅ Successfully loaded {len(df)} records from master_tracker.csv")
-    except Exception as e:
-        print(f"❌ Error reading master_tracker.csv: {e}")
-        return
-    
-    # Clean and prepare data
-    print("🧹 Cleaning and preparing data...")
-    
-    # Ensure required columns exist
+    # Required columns
     required_columns = ['ZBM Terr Code', 'ZBM Name', 'ZBM EMAIL_ID',
                         'ABM Terr Code', 'ABM Name', 'ABM EMAIL_ID',
                         'TBM HQ', 'TBM EMAIL_ID',
                         'Doctor: Customer Code', 'Assigned Request Ids', 'Request Status', 'Rto Reason']
-    missing = [c for c in required_columns if c not in df.columns]
-    if missing:
-        print(f"❌ Missing required columns in master_tracker.csv: {missing}")
+    
+    # Read and clean master tracker data (shared with the other summary scripts)
+    df = load_master_tracker(required_columns)
+    if df is None:
         return
 
-    # Remove rows where key fields are null or empty
-    df = df.dropna(subset=['ZBM Terr Code', 'ZBM Name', 'ABM Terr Code', 'ABM Name', 'TBM HQ'])
-    df = df[df['ZBM Terr Code'].astype(str).str.strip() != '']
-    df = df[df['ABM Terr Code'].astype(str).str.strip() != '']
-    df = df[df['TBM HQ'].astype(str).str.strip() != '']
-
-    print(f"📊 After cleaning: {len(df)} records remaining")
-
     # Compute Final Answer per unique request id using corrected rules
     print("🧠 Computing final status per unique Request Id using corrected rules...")
     try:
-        def normalize(text):
-            normalized = str(text).strip().casefold()
-            normalized = normalized.replace('  ', ' ')  # Fix spacing issues
-            return normalized
-
-        # Load rules from logic.xlsx
-        xls_rules = pd.ExcelFile('logic.xlsx')
-        sheet2 = pd.read_excel(xls_rules, 'Sheet2')
+        # Rules from logic.xlsx plus the missing rules identified from validation
+        rules = build_rules(PAIR_RULES)
 
-        rules = {}
-        for _, row in sheet2.iterrows():
-            statuses = [normalize(s) for s in row.drop('Final Answer').dropna().tolist()]
-            statuses = tuple(sorted(set(statuses)))
-            rules[statuses] = row['Final Answer']
-
-        # Add missing rules identified from validation
-        additional_rules = {
-            ('action pending / in process', 'delivered'): 'Delivered',
-            ('action pending / in process', 'dispatched & in transit'): 'Dispatched & In Transit',
-            ('action pending / in process', 'dispatch pending'): 'Dispatch Pending',
-            ('action pending / in process', 'out of stock'): 'Out of stock',
-            ('action pending / in process', 'return'): 'Return',
-            ('delivered', 'return'): 'Delivered',
-            ('dispatch pending', 'delivered'): 'Delivered',
-            ('dispatch pending', 'dispatched & in transit'): 'Dispatched & In Transit',
-            ('dispatch pending', 'return'): 'Return',
-            ('dispatched & in transit', 'return'): 'Dispatched & In Transit',
-            ('out of stock', 'return'): 'Out of stock',
-            ('request raised', 'action pending / in process'): 'Action pending / In Process',
-            ('request raised', 'delivered'): 'Delivered',
-            ('request raised', 'dispatch pending'): 'Dispatch Pending',
-            ('request raised', 'dispatched & in transit'): 'Dispatched & In Transit',
-            ('request raised', 'out of stock'): 'Out of stock',
-            ('request raised', 'return'): 'Return',
-        }
-        
-        rules.update(additional_rules)
-
-        # Apply rules to compute Final Answer
-        def compute_final_answer(request_id):
-            request_data = df[df['Assigned Request Ids'] == request_id]
-            if len(request_data) == 0:
-                return 'Unknown'
-            
-            statuses = [normalize(s) for s in request_data['Request Status'].dropna().unique()]
-            statuses = tuple(sorted(set(statuses)))
-            
-            if statuses in rules:
-                return rules[statuses]
-            else:
-                # If no rule found, return the most common status
-                return request_data['Request Status'].mode().iloc[0] if len(request_data['Request Status'].mode()) > 0 else 'Unknown'
-
-        # Apply final answer computation
-        unique_requests = df['Assigned Request Ids'].unique()
-        print(f"🔍 Computing final answers for {len(unique_requests)} unique requests...")
-        
-        final_answers = {}
-        for req_id in unique_requests:
-            final_answers[req_id] = compute_final_answer(req_id)
-        
-        # Map final answers back to dataframe
-        df['Final Answer'] = df['Assigned Request Ids'].map(final_answers)
+        # Apply rules to compute Final Answer for all requests at once
+        df['Final Answer'] = compute_final_answers(df, rules)
         
         print("✅ Final Answer computation completed")
         
@@ -156,12 +80,15 @@ def create_manager_presentation_demo():
     print(f"\n🔍 SAMPLE ZBM VALIDATION (First 3 ZBMs):")
     sample_zbms = zbms.head(3)
     
+    # Group once and look up each ZBM/ABM slice instead of re-scanning the whole frame
+    zbm_groups = df.groupby('ZBM Terr Code', observed=True, sort=False)
+    
     for i, (_, zbm_row) in enumerate(sample_zbms.iterrows()):
         zbm_code = zbm_row['ZBM Terr Code']
         zbm_name = zbm_row['ZBM Name']
         zbm_email = zbm_row['ZBM EMAIL_ID']
         
-        zbm_data = df[df['ZBM Terr Code'] == zbm_code]
+        zbm_data = zbm_groups.get_group(zbm_code) if zbm_code in zbm_groups.groups else df.iloc[:0]
         abms = zbm_data[['ABM Terr Code', 'ABM Name']].drop_duplicates()
         
         total_requests = zbm_data['Assigned Request Ids'].nunique()
@@ -176,10 +103,11 @@ def create_manager_presentation_demo():
         # Validate formulas for this ZBM
         total_sent_to_hub = 0
         total_requests_dispatched = 0
+        abm_groups = zbm_data.groupby('ABM Terr Code', observed=True, sort=False)
         
         for _, abm_row in abms.iterrows():
             abm_code = abm_row['ABM Terr Code']
-            abm_data = zbm_data[zbm_data['ABM Terr Code'] == abm_code]
+            abm_data = abm_groups.get_group(abm_code) if abm_code in abm_groups.groups else zbm_data.iloc[:0]
             
             # Calculate metrics
             delivered = abm_data[abm_data['Final Answer'].isin(['Delivered'])]['Assigned Request Ids'].nunique()
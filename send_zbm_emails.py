@@ -8,34 +8,114 @@ USES OUTLOOK TO DISPLAY EMAILS (NOT SEND AUTOMATICALLY)
 import pandas as pd
 import os
 from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import warnings
 import win32com.client
-from openpyxl import load_workbook
+from logic_rules import load_status_mapping
+from zbm_common import cached_read, STRING_DTYPE, EXCEL_ENGINE
 
 # Suppress pandas warnings
 warnings.filterwarnings('ignore', category=FutureWarning, module='pandas')
 
+def read_master_tracker(path, columns):
+    """Read the given columns of the master tracker as text"""
+    return pd.read_excel(path, usecols=lambda c: c in columns, dtype=STRING_DTYPE, engine=EXCEL_ENGINE)
+
+# Stylesheet shared by every HTML fallback email
+HTML_EMAIL_STYLE = """    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; }
+        table { border-collapse: collapse; width: 100%; margin: 20px 0; }
+        th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+        th { background-color: #f2f2f2; font-weight: bold; }
+        .total-row { background-color: #e0e0e0; font-weight: bold; }
+        .header { background-color: #f0f0f0; padding: 10px; margin-bottom: 20px; }
+    </style>"""
+
+# Static parts of the email summary table, built once: the section heading, table start and
+# both header rows, then the table end and colour legend
+SUMMARY_TABLE_HEADER_HTML = ''.join([
+    "<div style='font-family: Arial, sans-serif; margin: 20px 0;'>",
+    
+    # Add section headers with styling
+    "<div style='background-color: #f8f9fa; padding: 15px; border-left: 4px solid #007bff; margin-bottom: 20px;'>",
+    "<h3 style='margin: 0; color: #007bff;'>Sample Request Status Summary</h3>",
+    "<p style='margin: 5px 0 0 0; color: #666;'>Complete breakdown of sample requests by ABM territory</p>",
+    "</div>",
+    
+    # Create main summary table
+    "<table border='1' cellpadding='8' cellspacing='0' style='border-collapse: collapse; width: 100%; font-size: 11px; margin-bottom: 20px;'>",
+    
+    # Header row with all columns from summary report
+    "<tr style='background-color: #e9ecef; font-weight: bold; text-align: center;'>",
+    "<th rowspan='2' style='vertical-align: middle;'>Area Name</th>",
+    "<th rowspan='2' style='vertical-align: middle;'>ABM Name</th>",
+    "<th rowspan='2' style='vertical-align: middle;'># Unique<br/>TBMs</th>",
+    "<th rowspan='2' style='vertical-align: middle;'># Unique<br/>HCPs</th>",
+    "<th rowspan='2' style='vertical-align: middle;'># Requests<br/>Raised<br/>(A+B+C)</th>",
+    "<th colspan='2' style='background-color: #fff3cd;'>HO Section</th>",
+    "<th colspan='3' style='background-color: #d1ecf1;'>HUB Section</th>",
+    "<th colspan='3' style='background-color: #d4edda;'>Delivery Status</th>",
+    "<th colspan='4' style='background-color: #f8d7da;'>RTO Reasons</th>",
+    "</tr>",
+    
+    # Sub-header row
+    "<tr style='background-color: #e9ecef; font-weight: bold; text-align: center;'>",
+    "<th style='background-color: #fff3cd;'>Request Cancelled /<br/>Out of Stock (A)</th>",
+    "<th style='background-color: #fff3cd;'>Action pending /<br/>In Process At HO (B)</th>",
+    "<th style='background-color: #d1ecf1;'>Sent to HUB (C)<br/>(D+E+F)</th>",
+    "<th style='background-color: #d1ecf1;'>Pending for<br/>Invoicing (D)</th>",
+    "<th style='background-color: #d1ecf1;'>Pending for<br/>Dispatch (E)</th>",
+    "<th style='background-color: #d4edda;'># Requests Dispatched (F)<br/>(G+H+I)</th>",
+    "<th style='background-color: #d4edda;'>Delivered (G)</th>",
+    "<th style='background-color: #d4edda;'>Dispatched &<br/>In Transit (H)</th>",
+    "<th style='background-color: #f8d7da;'>RTO (I)</th>",
+    "<th style='background-color: #f8d7da;'>Incomplete<br/>Address</th>",
+    "<th style='background-color: #f8d7da;'>Doctor Non<br/>Contactable</th>",
+    "<th style='background-color: #f8d7da;'>Doctor Refused<br/>to Accept</th>",
+    "</tr>",
+])
+
+SUMMARY_TABLE_FOOTER_HTML = ''.join([
+    "</table>",
+    
+    # Add legend/explanation
+    "<div style='background-color: #f8f9fa; padding: 10px; border-radius: 5px; font-size: 10px; color: #666;'>",
+    "<strong>Legend:</strong> ",
+    "<span style='background-color: #fff3cd; padding: 2px 5px; margin: 0 5px;'>HO Section</span> ",
+    "<span style='background-color: #d1ecf1; padding: 2px 5px; margin: 0 5px;'>HUB Section</span> ",
+    "<span style='background-color: #d4edda; padding: 2px 5px; margin: 0 5px;'>Delivery Status</span> ",
+    "<span style='background-color: #f8d7da; padding: 2px 5px; margin: 0 5px;'>RTO Reasons</span>",
+    "</div>",
+    
+    "</div>",
+])
+
 def send_zbm_emails():
     """Display emails in Outlook for review without sending"""
     
     print("🚀 Starting ZBM Email Display...")
     print("📧 This will DISPLAY emails in Outlook for review - NOT SEND automatically")
     
+    # Required columns
+    required_columns = [
+        'ZBM Terr Code', 'ZBM Name', 'ZBM EMAIL_ID', 'ABM Terr Code', 'ABM Name', 'ABM EMAIL_ID',
+        'Assigned Request Ids', 'Doctor: Customer Code', 'Request Status', 'TBM EMAIL_ID', 'TBM HQ'
+    ]
+    
     # Read Sample Master Tracker data
     print("📖 Reading Sample Master Tracker.xlsx...")
     try:
-        df = pd.read_excel('Sample Master Tracker.xlsx')
+        # Parsed with python-calamine when installed, else streamed by openpyxl in read-only/data-only
+        # mode; only the required columns are parsed (a missing one is reported by the check below),
+        # and all of them are text, so they are read as strings to skip per-cell type inference.
+        # With pyarrow installed, later runs on the same file load the cached Parquet copy instead
+        df = cached_read(read_master_tracker, 'Sample Master Tracker.xlsx', 'email_tracker', columns=required_columns)
         print(f"✅ Successfully loaded {len(df)} records from Sample Master Tracker.xlsx")
     except Exception as e:
         print(f"❌ Error reading Sample Master Tracker.xlsx: {e}")
         return
     
-    # Required columns
-    required_columns = [
-        'ZBM Terr Code', 'ZBM Name', 'ZBM EMAIL_ID', 'ABM Terr Code', 'ABM Name', 'ABM EMAIL_ID',
-        'Assigned Request Ids', 'Doctor: Customer Code', 'Request Status', 'TBM EMAIL_ID', 'TBM HQ'
-    ]
-    
     # Check for missing columns
     missing = [c for c in required_columns if c not in df.columns]
     if missing:
@@ -44,70 +124,24 @@ def send_zbm_emails():
     
     # Clean and filter data
     df = df.dropna(subset=['ZBM Terr Code', 'ZBM Name', 'ABM Terr Code', 'ABM Name'])
-    df = df[df['ZBM Terr Code'].astype(str).str.strip() != '']
-    df = df[df['ABM Terr Code'].astype(str).str.strip() != '']
-    df = df[df['ZBM Terr Code'].astype(str).str.startswith('ZN')]
+    # The codes are already read as strings; a ZBM code starting with 'ZN' is never blank
+    df = df[df['ZBM Terr Code'].str.startswith('ZN') & (df['ABM Terr Code'].str.strip() != '')]
     
     print(f"📊 After cleaning: {len(df)} records remaining")
     
+    # Low-cardinality columns as categoricals, so grouping, de-duplicating and sorting on them
+    # compares integer codes
+    for col in ('Request Status', 'ZBM Terr Code', 'ABM Terr Code', 'ABM Name'):
+        df[col] = df[col].astype('category')
+    
     # Compute Final Status using logic.xlsx
     print("🧠 Computing final status...")
     try:
-        xls_rules = pd.ExcelFile('logic.xlsx')
+        status_mapping = load_status_mapping()
         
-        # Check available sheet names
-        sheet_names = xls_rules.sheet_names
-        print(f"   📋 Available sheets in logic.xlsx: {sheet_names}")
-        
-        # Try to find the rules sheet (case-insensitive)
-        rules_sheet = None
-        for sheet in sheet_names:
-            if 'rule' in sheet.lower():
-                rules_sheet = sheet
-                break
-        
-        if rules_sheet:
-            print(f"   📖 Using sheet: {rules_sheet}")
-            rules_df = pd.read_excel(xls_rules, rules_sheet)
-        else:
-            # Use the first sheet if no rules sheet found
-            rules_sheet = sheet_names[0]
-            print(f"   📖 Using first sheet: {rules_sheet}")
-            rules_df = pd.read_excel(xls_rules, rules_sheet)
-        
-        # Check if required columns exist
-        required_rule_columns = ['Request Status', 'Final Answer']
-        missing_rule_columns = [col for col in required_rule_columns if col not in rules_df.columns]
-        
-        if missing_rule_columns:
-            print(f"   ⚠️ Missing columns in rules sheet: {missing_rule_columns}")
-            print(f"   📋 Available columns: {list(rules_df.columns)}")
-            # Use alternative column names if available
-            status_col = None
-            answer_col = None
-            
-            for col in rules_df.columns:
-                if 'request' in col.lower() and 'status' in col.lower():
-                    status_col = col
-                if 'final' in col.lower() and 'answer' in col.lower():
-                    answer_col = col
-            
-            if status_col and answer_col:
-                print(f"   🔄 Using alternative columns: {status_col} -> {answer_col}")
-                status_mapping = {}
-                for _, row in rules_df.iterrows():
-                    if pd.notna(row[status_col]) and pd.notna(row[answer_col]):
-                        status_mapping[row[status_col]] = row[answer_col]
-            else:
-                raise Exception("Cannot find suitable columns for status mapping")
-        else:
-            status_mapping = {}
-            for _, row in rules_df.iterrows():
-                if pd.notna(row['Request Status']) and pd.notna(row['Final Answer']):
-                    status_mapping[row['Request Status']] = row['Final Answer']
-        
-        df['Final Status'] = df['Request Status'].map(status_mapping)
-        df['Final Status'] = df['Final Status'].fillna(df['Request Status'])
+        # Request Status is categorical, so each distinct status is looked up once rather than
+        # once per row; statuses without a rule keep their Request Status value
+        df['Final Status'] = df['Request Status'].map(lambda status: status_mapping.get(status, status))
         print("✅ Final status computed successfully")
         
     except Exception as e:
@@ -119,28 +153,46 @@ def send_zbm_emails():
     zbms = df[['ZBM Terr Code', 'ZBM Name', 'ZBM EMAIL_ID']].drop_duplicates().sort_values('ZBM Terr Code')
     print(f"📋 Found {len(zbms)} unique ZBMs")
     
-    # Initialize Outlook with robust error handling
-    print("📧 Initializing Outlook...")
-    outlook = None
-    
-    # Try different Outlook initialization methods
-    outlook_methods = [
-        "Outlook.Application",
-        "Outlook.Application.16",  # Office 2016/2019/365
-        "Outlook.Application.15",  # Office 2013
-        "Outlook.Application.14",  # Office 2010
-        "Outlook.Application.12",  # Office 2007
-    ]
+    # ABMs for the CC lists: one row per ZBM/ABM pair, in ABM code order, de-duplicated and sorted
+    # across all ZBMs at once and then split by ZBM, instead of repeating that work for every ZBM
+    abm_keys = ['ABM Terr Code', 'ABM Name', 'ABM EMAIL_ID']
+    abm_groups = dict(list(df[['ZBM Terr Code'] + abm_keys + ['TBM HQ']]
+                           .drop_duplicates(subset=['ZBM Terr Code'] + abm_keys)
+                           .sort_values(abm_keys)
+                           .groupby('ZBM Terr Code', observed=True, sort=False)))
+    
+    # Locate every ZBM summary report and consolidated file in one directory walk
+    summary_reports, consolidated_files = find_zbm_files()
+    print(f"📂 Found {len(summary_reports)} ZBM summary reports and {len(consolidated_files)} consolidated files")
+    
+    # One date for the whole run, shown in every subject line
+    current_date = datetime.now().strftime('%B %d, %Y')
+    
+    # Emails are built lazily as they are consumed, so Outlook (or the HTML fallback) handles each
+    # ZBM's email as soon as it is ready while the remaining summary workbooks are still being read
+    payloads = build_payloads(abm_groups, zbms, summary_reports)
     
-    for method in outlook_methods:
+    # Initialize Outlook: attach to the running instance when there is one, else start it. The
+    # version-independent ProgID resolves to whichever Outlook version is installed
+    print("📧 Initializing Outlook...")
+    try:
         try:
-            print(f"   🔄 Trying: {method}")
-            outlook = win32com.client.Dispatch(method)
-            print(f"✅ Outlook initialized successfully using: {method}")
-            break
-        except Exception as e:
-            print(f"   ❌ Failed with {method}: {e}")
-            continue
+            outlook = win32com.client.GetActiveObject("Outlook.Application")
+            print("   🔄 Attached to running Outlook")
+        except Exception:
+            print("   🔄 Outlook is not running, starting it")
+            outlook = win32com.client.Dispatch("Outlook.Application")
+        
+        # Early binding generates the Outlook type library wrapper once, so property sets on every
+        # mail item skip the IDispatch name lookup; keep the late-bound object if it can't be built
+        try:
+            outlook = win32com.client.gencache.EnsureDispatch(outlook)
+        except Exception:
+            pass
+        print("✅ Outlook initialized successfully")
+    except Exception as e:
+        print(f"   ❌ Failed to start Outlook: {e}")
+        outlook = None
     
     if outlook is None:
         print("❌ Could not initialize Outlook with any method")
@@ -153,43 +205,19 @@ def send_zbm_emails():
         
         # Fallback: Create HTML email files
         print("\n🔄 Creating HTML email files as fallback...")
-        create_html_email_files(df, zbms)
+        create_html_email_files(payloads, current_date)
         return
     
-    # Process each ZBM
+    # Display each prepared email
     success_count = 0
     error_count = 0
     
-    for _, zbm_row in zbms.iterrows():
-        zbm_code = zbm_row['ZBM Terr Code']
-        zbm_name = zbm_row['ZBM Name']
-        zbm_email = zbm_row['ZBM EMAIL_ID']
-        
-        print(f"\n🔄 Processing ZBM: {zbm_code} - {zbm_name}")
+    for zbm_code, zbm_name, zbm_email, email_content, cc_emails in payloads:
+        print(f"\n📧 Displaying email for ZBM: {zbm_code} - {zbm_name}")
         
         try:
-            # Read the actual ZBM summary report file
-            zbm_summary_df = read_zbm_summary_report(zbm_code, zbm_name)
-            
-            if zbm_summary_df is None or zbm_summary_df.empty:
-                print(f"⚠️ No ZBM summary report found for {zbm_code}")
-                continue
-            
-            # Convert summary report data to email format
-            summary_data = create_summary_data_from_report(zbm_summary_df)
-            summary_df = pd.DataFrame(summary_data)
-            
-            # Get ABM emails for CC from the original data
-            zbm_data = df[df['ZBM Terr Code'] == zbm_code]
-            abms = zbm_data.groupby(['ABM Terr Code', 'ABM Name', 'ABM EMAIL_ID']).agg({
-                'TBM HQ': 'first'
-            }).reset_index()
-            
-            # Generate email content
-            email_content, cc_emails = generate_email_content(zbm_name, zbm_email, abms, summary_df)
-            
             # Display email in Outlook (without sending)
-            display_single_email(outlook, zbm_email, cc_emails, email_content, zbm_code, zbm_name)
+            display_single_email(outlook, zbm_email, cc_emails, email_content, consolidated_files.get(zbm_code), current_date)
             
             success_count += 1
             print(f"   ✅ Email displayed in Outlook for {zbm_name}")
@@ -204,73 +232,129 @@ def send_zbm_emails():
     print(f"❌ Failed to display: {error_count} emails")
     print(f"\n📧 All emails are now open in Outlook for your review and manual sending")
 
-def read_zbm_summary_report(zbm_code, zbm_name):
-    """Read the actual ZBM summary report file created by create_zbm_hierarchical_reports.py"""
+def build_payloads(abm_groups, zbms, summary_reports):
+    """Yield the email for each ZBM as (zbm_code, zbm_name, zbm_email, email_content, cc_emails)"""
+    
+    prepared_count = 0
+    
+    # Reading the summary workbooks is the slow part and each file is independent, so start all the
+    # reads on a thread pool up front (on the first request for an email); emails are still built
+    # (and logged) in ZBM order as they arrive
+    zbm_codes = set(zbms['ZBM Terr Code'])
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        report_futures = {zbm_code: executor.submit(pd.read_excel, filepath, sheet_name='ZBM', engine=EXCEL_ENGINE)
+                          for zbm_code, filepath in summary_reports.items() if zbm_code in zbm_codes}
+        
+        for zbm_code, zbm_name, zbm_email in zbms[['ZBM Terr Code', 'ZBM Name', 'ZBM EMAIL_ID']].itertuples(index=False, name=None):
+            print(f"\n🔄 Processing ZBM: {zbm_code} - {zbm_name}")
+            
+            try:
+                # Read the actual ZBM summary report file
+                zbm_summary_df = read_zbm_summary_report(zbm_code, summary_reports, report_futures)
+                
+                if zbm_summary_df is None or zbm_summary_df.empty:
+                    print(f"⚠️ No ZBM summary report found for {zbm_code}")
+                    continue
+                
+                # Convert summary report data to email format
+                summary_data = create_summary_data_from_report(zbm_summary_df)
+                
+                # Get ABM emails for CC from the original data (one row per ABM, in ABM code order)
+                abms = abm_groups[zbm_code]
+                
+                # Generate email content
+                email_content, cc_emails = generate_email_content(zbm_name, zbm_email, abms, summary_data)
+                
+                prepared_count += 1
+                yield zbm_code, zbm_name, zbm_email, email_content, cc_emails
+                
+            except Exception as e:
+                print(f"   ❌ Error preparing email for {zbm_name}: {e}")
+                continue
     
-    # Look for ZBM summary report files in current directory and subdirectories
-    for root, dirs, files in os.walk('.'):
+    print(f"\n📋 Prepared {prepared_count} emails")
+
+def find_zbm_files():
+    """Find the ZBM summary reports and consolidated files in current directory and subdirectories, by ZBM code"""
+    
+    # File names look like ZBM_Summary_<code>_<name>_<timestamp>.xlsx; the first match per code wins.
+    # The walk starts from the absolute working directory so every path found is a full path, which
+    # Outlook needs for attachments
+    summary_reports = {}
+    consolidated_files = {}
+    for root, dirs, files in os.walk(os.path.abspath('.')):
         for file in files:
-            if file.startswith(f"ZBM_Summary_{zbm_code}_") and file.endswith('.xlsx'):
-                filepath = os.path.join(root, file)
-                print(f"   📊 Found ZBM summary report: {file}")
-                
-                try:
-                    # Read the Excel file
-                    df = pd.read_excel(filepath, sheet_name='ZBM')
-                    print(f"   ✅ Successfully loaded ZBM summary report with {len(df)} ABMs")
-                    return df
-                except Exception as e:
-                    print(f"   ❌ Error reading ZBM summary report: {e}")
-                    return None
-    
-    print(f"   ⚠️ No ZBM summary report found for {zbm_code}")
-    return None
+            if not file.endswith('.xlsx'):
+                continue
+            if file.startswith('ZBM_Summary_'):
+                summary_reports.setdefault(file.split('_', 3)[2], os.path.join(root, file))
+            elif file.startswith('ZBM_Consolidated_'):
+                consolidated_files.setdefault(file.split('_', 3)[2], os.path.join(root, file))
+    
+    return summary_reports, consolidated_files
+
+def read_zbm_summary_report(zbm_code, summary_reports, report_futures):
+    """Read the actual ZBM summary report file created by create_zbm_hierarchical_reports.py"""
+    
+    filepath = summary_reports.get(zbm_code)
+    if filepath is None:
+        print(f"   ⚠️ No ZBM summary report found for {zbm_code}")
+        return None
+    
+    print(f"   📊 Found ZBM summary report: {os.path.basename(filepath)}")
+    try:
+        # Read the Excel file (loaded on the thread pool started in build_payloads)
+        df = report_futures[zbm_code].result()
+        print(f"   ✅ Successfully loaded ZBM summary report with {len(df)} ABMs")
+        return df
+    except Exception as e:
+        print(f"   ❌ Error reading ZBM summary report: {e}")
+        return None
 
 def create_summary_data_from_report(summary_df):
-    """Convert ZBM summary report data to email format"""
+    """Convert ZBM summary report data to email format, as one dict per ABM row"""
     
     if summary_df is None or summary_df.empty:
         return []
     
-    summary_data = []
-    
-    for _, row in summary_df.iterrows():
-        # Map the data from the Excel report to email format
-        summary_data.append({
-            'Area Name': row.get('Area Name', ''),
-            'ABM Name': row.get('ABM Name', ''),
-            'Unique TBMs': row.get('Unique TBMs', 0),
-            'Unique HCPs': row.get('Unique HCPs', 0),
-            'Unique Requests': row.get('Requests Raised', 0),  # Use Requests Raised as Unique Requests
-            'Requests Raised': row.get('Requests Raised', 0),
-            'Request Cancelled Out of Stock': row.get('Request Cancelled Out of Stock', 0),
-            'Action Pending at HO': row.get('Action Pending at HO', 0),
-            'Sent to HUB': row.get('Sent to HUB', 0),
-            'Pending for Invoicing': row.get('Pending for Invoicing', 0),
-            'Pending for Dispatch': row.get('Pending for Dispatch', 0),
-            'Requests Dispatched': row.get('Requests Dispatched', 0),
-            'Delivered': row.get('Delivered', 0),
-            'Dispatched In Transit': row.get('Dispatched In Transit', 0),
-            'RTO': row.get('RTO', 0),
-            'Incomplete Address': row.get('Incomplete Address', 0),
-            'Doctor Non Contactable': row.get('Doctor Non Contactable', 0),
-            'Doctor Refused to Accept': row.get('Doctor Refused to Accept', 0),
-            'Hold Delivery': row.get('Hold Delivery', 0)
-        })
-    
-    return summary_data
+    # Email column -> (summary report column, default when the report has no such column)
+    column_sources = {
+        'Area Name': ('Area Name', ''),
+        'ABM Name': ('ABM Name', ''),
+        'Unique TBMs': ('Unique TBMs', 0),
+        'Unique HCPs': ('Unique HCPs', 0),
+        'Unique Requests': ('Requests Raised', 0),  # Use Requests Raised as Unique Requests
+        'Requests Raised': ('Requests Raised', 0),
+        'Request Cancelled Out of Stock': ('Request Cancelled Out of Stock', 0),
+        'Action Pending at HO': ('Action Pending at HO', 0),
+        'Sent to HUB': ('Sent to HUB', 0),
+        'Pending for Invoicing': ('Pending for Invoicing', 0),
+        'Pending for Dispatch': ('Pending for Dispatch', 0),
+        'Requests Dispatched': ('Requests Dispatched', 0),
+        'Delivered': ('Delivered', 0),
+        'Dispatched In Transit': ('Dispatched In Transit', 0),
+        'RTO': ('RTO', 0),
+        'Incomplete Address': ('Incomplete Address', 0),
+        'Doctor Non Contactable': ('Doctor Non Contactable', 0),
+        'Doctor Refused to Accept': ('Doctor Refused to Accept', 0),
+        'Hold Delivery': ('Hold Delivery', 0)
+    }
+    
+    # Map the data from the Excel report to email format, whole columns at a time, then zip the
+    # columns into plain row dicts (the table renderer needs nothing more than that)
+    columns = {column: summary_df[source].tolist() if source in summary_df.columns else [default] * len(summary_df)
+               for column, (source, default) in column_sources.items()}
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
 
-def generate_email_content(zbm_name, zbm_email, abms, summary_df):
+def generate_email_content(zbm_name, zbm_email, abms, summary_data):
     """Generate professional email content"""
     
-    current_date = datetime.now().strftime('%B %d, %Y')
-    
     # Get ABM emails for CC
     abm_emails = abms['ABM EMAIL_ID'].dropna().unique().tolist()
     cc_emails = ', '.join(abm_emails)
     
     # Create summary table HTML
-    table_html = create_summary_table_html(summary_df)
+    table_html = create_summary_table_html(summary_data)
     
     email_content = f"""
 Hi {zbm_name},
@@ -293,114 +377,82 @@ Umesh Pawar.
     
     return email_content, cc_emails
 
-def create_summary_table_html(summary_df):
-    """Create HTML table for summary data with all columns from summary report including section headers"""
+def create_summary_table_html(summary_data):
+    """Create HTML table for summary data (one dict per ABM) with all columns from summary report including section headers"""
     
-    if summary_df.empty:
+    if not summary_data:
         return "<p>No data available</p>"
     
-    # Create comprehensive HTML table with section headers and all data
-    html = "<div style='font-family: Arial, sans-serif; margin: 20px 0;'>"
-    
-    # Add section headers with styling
-    html += "<div style='background-color: #f8f9fa; padding: 15px; border-left: 4px solid #007bff; margin-bottom: 20px;'>"
-    html += "<h3 style='margin: 0; color: #007bff;'>Sample Request Status Summary</h3>"
-    html += "<p style='margin: 5px 0 0 0; color: #666;'>Complete breakdown of sample requests by ABM territory</p>"
-    html += "</div>"
-    
-    # Create main summary table
-    html += "<table border='1' cellpadding='8' cellspacing='0' style='border-collapse: collapse; width: 100%; font-size: 11px; margin-bottom: 20px;'>"
-    
-    # Header row with all columns from summary report
-    html += "<tr style='background-color: #e9ecef; font-weight: bold; text-align: center;'>"
-    html += "<th rowspan='2' style='vertical-align: middle;'>Area Name</th>"
-    html += "<th rowspan='2' style='vertical-align: middle;'>ABM Name</th>"
-    html += "<th rowspan='2' style='vertical-align: middle;'># Unique<br/>TBMs</th>"
-    html += "<th rowspan='2' style='vertical-align: middle;'># Unique<br/>HCPs</th>"
-    html += "<th rowspan='2' style='vertical-align: middle;'># Requests<br/>Raised<br/>(A+B+C)</th>"
-    html += "<th colspan='2' style='background-color: #fff3cd;'>HO Section</th>"
-    html += "<th colspan='3' style='background-color: #d1ecf1;'>HUB Section</th>"
-    html += "<th colspan='3' style='background-color: #d4edda;'>Delivery Status</th>"
-    html += "<th colspan='4' style='background-color: #f8d7da;'>RTO Reasons</th>"
-    html += "</tr>"
-    
-    # Sub-header row
-    html += "<tr style='background-color: #e9ecef; font-weight: bold; text-align: center;'>"
-    html += "<th style='background-color: #fff3cd;'>Request Cancelled /<br/>Out of Stock (A)</th>"
-    html += "<th style='background-color: #fff3cd;'>Action pending /<br/>In Process At HO (B)</th>"
-    html += "<th style='background-color: #d1ecf1;'>Sent to HUB (C)<br/>(D+E+F)</th>"
-    html += "<th style='background-color: #d1ecf1;'>Pending for<br/>Invoicing (D)</th>"
-    html += "<th style='background-color: #d1ecf1;'>Pending for<br/>Dispatch (E)</th>"
-    html += "<th style='background-color: #d4edda;'># Requests Dispatched (F)<br/>(G+H+I)</th>"
-    html += "<th style='background-color: #d4edda;'>Delivered (G)</th>"
-    html += "<th style='background-color: #d4edda;'>Dispatched &<br/>In Transit (H)</th>"
-    html += "<th style='background-color: #f8d7da;'>RTO (I)</th>"
-    html += "<th style='background-color: #f8d7da;'>Incomplete<br/>Address</th>"
-    html += "<th style='background-color: #f8d7da;'>Doctor Non<br/>Contactable</th>"
-    html += "<th style='background-color: #f8d7da;'>Doctor Refused<br/>to Accept</th>"
-    html += "</tr>"
+    # Summary table with section headers and all data; the pieces are collected in a list and
+    # joined once at the end
+    parts = [SUMMARY_TABLE_HEADER_HTML]
     
     # Data rows
-    for _, row in summary_df.iterrows():
-        html += "<tr style='border-bottom: 1px solid #dee2e6;'>"
-        html += f"<td style='font-weight: bold;'>{row.get('Area Name', '')}</td>"
-        html += f"<td>{row.get('ABM Name', '')}</td>"
-        html += f"<td style='text-align: center;'>{row.get('Unique TBMs', 0)}</td>"
-        html += f"<td style='text-align: center;'>{row.get('Unique HCPs', 0)}</td>"
-        html += f"<td style='text-align: center; font-weight: bold; background-color: #f8f9fa;'>{row.get('Requests Raised', 0)}</td>"
-        html += f"<td style='text-align: center; background-color: #fff3cd;'>{row.get('Request Cancelled Out of Stock', 0)}</td>"
-        html += f"<td style='text-align: center; background-color: #fff3cd;'>{row.get('Action Pending at HO', 0)}</td>"
-        html += f"<td style='text-align: center; background-color: #d1ecf1;'>{row.get('Sent to HUB', 0)}</td>"
-        html += f"<td style='text-align: center; background-color: #d1ecf1;'>{row.get('Pending for Invoicing', 0)}</td>"
-        html += f"<td style='text-align: center; background-color: #d1ecf1;'>{row.get('Pending for Dispatch', 0)}</td>"
-        html += f"<td style='text-align: center; background-color: #d4edda;'>{row.get('Requests Dispatched', 0)}</td>"
-        html += f"<td style='text-align: center; background-color: #d4edda;'>{row.get('Delivered', 0)}</td>"
-        html += f"<td style='text-align: center; background-color: #d4edda;'>{row.get('Dispatched In Transit', 0)}</td>"
-        html += f"<td style='text-align: center; background-color: #f8d7da;'>{row.get('RTO', 0)}</td>"
-        html += f"<td style='text-align: center; background-color: #f8d7da;'>{row.get('Incomplete Address', 0)}</td>"
-        html += f"<td style='text-align: center; background-color: #f8d7da;'>{row.get('Doctor Non Contactable', 0)}</td>"
-        html += f"<td style='text-align: center; background-color: #f8d7da;'>{row.get('Doctor Refused to Accept', 0)}</td>"
-        html += "</tr>"
+    for row in summary_data:
+        parts.append("<tr style='border-bottom: 1px solid #dee2e6;'>")
+        parts.append(f"<td style='font-weight: bold;'>{row.get('Area Name', '')}</td>")
+        parts.append(f"<td>{row.get('ABM Name', '')}</td>")
+        parts.append(f"<td style='text-align: center;'>{row.get('Unique TBMs', 0)}</td>")
+        parts.append(f"<td style='text-align: center;'>{row.get('Unique HCPs', 0)}</td>")
+        parts.append(f"<td style='text-align: center; font-weight: bold; background-color: #f8f9fa;'>{row.get('Requests Raised', 0)}</td>")
+        parts.append(f"<td style='text-align: center; background-color: #fff3cd;'>{row.get('Request Cancelled Out of Stock', 0)}</td>")
+        parts.append(f"<td style='text-align: center; background-color: #fff3cd;'>{row.get('Action Pending at HO', 0)}</td>")
+        parts.append(f"<td style='text-align: center; background-color: #d1ecf1;'>{row.get('Sent to HUB', 0)}</td>")
+        parts.append(f"<td style='text-align: center; background-color: #d1ecf1;'>{row.get('Pending for Invoicing', 0)}</td>")
+        parts.append(f"<td style='text-align: center; background-color: #d1ecf1;'>{row.get('Pending for Dispatch', 0)}</td>")
+        parts.append(f"<td style='text-align: center; background-color: #d4edda;'>{row.get('Requests Dispatched', 0)}</td>")
+        parts.append(f"<td style='text-align: center; background-color: #d4edda;'>{row.get('Delivered', 0)}</td>")
+        parts.append(f"<td style='text-align: center; background-color: #d4edda;'>{row.get('Dispatched In Transit', 0)}</td>")
+        parts.append(f"<td style='text-align: center; background-color: #f8d7da;'>{row.get('RTO', 0)}</td>")
+        parts.append(f"<td style='text-align: center; background-color: #f8d7da;'>{row.get('Incomplete Address', 0)}</td>")
+        parts.append(f"<td style='text-align: center; background-color: #f8d7da;'>{row.get('Doctor Non Contactable', 0)}</td>")
+        parts.append(f"<td style='text-align: center; background-color: #f8d7da;'>{row.get('Doctor Refused to Accept', 0)}</td>")
+        parts.append("</tr>")
+    
+    # Column totals in one pass over the rows; blank cells are skipped like pandas' sum would
+    # (a column missing from the summary totals 0)
+    total_columns = [
+        'Unique TBMs', 'Unique HCPs', 'Requests Raised', 'Request Cancelled Out of Stock',
+        'Action Pending at HO', 'Sent to HUB', 'Pending for Invoicing', 'Pending for Dispatch',
+        'Requests Dispatched', 'Delivered', 'Dispatched In Transit', 'RTO',
+        'Incomplete Address', 'Doctor Non Contactable', 'Doctor Refused to Accept'
+    ]
+    totals = {column: sum(row.get(column, 0) for row in summary_data if pd.notna(row.get(column, 0)))
+              for column in total_columns}
     
     # Total row with enhanced styling
-    html += "<tr style='background-color: #343a40; color: white; font-weight: bold; text-align: center;'>"
-    html += "<td style='font-size: 12px;'>TOTAL</td>"
-    html += "<td></td>"
-    html += f"<td>{summary_df.get('Unique TBMs', pd.Series()).sum()}</td>"
-    html += f"<td>{summary_df.get('Unique HCPs', pd.Series()).sum()}</td>"
-    html += f"<td style='font-size: 12px;'>{summary_df.get('Requests Raised', pd.Series()).sum()}</td>"
-    html += f"<td>{summary_df.get('Request Cancelled Out of Stock', pd.Series()).sum()}</td>"
-    html += f"<td>{summary_df.get('Action Pending at HO', pd.Series()).sum()}</td>"
-    html += f"<td>{summary_df.get('Sent to HUB', pd.Series()).sum()}</td>"
-    html += f"<td>{summary_df.get('Pending for Invoicing', pd.Series()).sum()}</td>"
-    html += f"<td>{summary_df.get('Pending for Dispatch', pd.Series()).sum()}</td>"
-    html += f"<td>{summary_df.get('Requests Dispatched', pd.Series()).sum()}</td>"
-    html += f"<td>{summary_df.get('Delivered', pd.Series()).sum()}</td>"
-    html += f"<td>{summary_df.get('Dispatched In Transit', pd.Series()).sum()}</td>"
-    html += f"<td>{summary_df.get('RTO', pd.Series()).sum()}</td>"
-    html += f"<td>{summary_df.get('Incomplete Address', pd.Series()).sum()}</td>"
-    html += f"<td>{summary_df.get('Doctor Non Contactable', pd.Series()).sum()}</td>"
-    html += f"<td>{summary_df.get('Doctor Refused to Accept', pd.Series()).sum()}</td>"
-    html += "</tr>"
-    
-    html += "</table>"
-    
-    # Add legend/explanation
-    html += "<div style='background-color: #f8f9fa; padding: 10px; border-radius: 5px; font-size: 10px; color: #666;'>"
-    html += "<strong>Legend:</strong> "
-    html += "<span style='background-color: #fff3cd; padding: 2px 5px; margin: 0 5px;'>HO Section</span> "
-    html += "<span style='background-color: #d1ecf1; padding: 2px 5px; margin: 0 5px;'>HUB Section</span> "
-    html += "<span style='background-color: #d4edda; padding: 2px 5px; margin: 0 5px;'>Delivery Status</span> "
-    html += "<span style='background-color: #f8d7da; padding: 2px 5px; margin: 0 5px;'>RTO Reasons</span>"
-    html += "</div>"
-    
-    html += "</div>"
-    
-    return html
+    parts.append("<tr style='background-color: #343a40; color: white; font-weight: bold; text-align: center;'>")
+    parts.append("<td style='font-size: 12px;'>TOTAL</td>")
+    parts.append("<td></td>")
+    parts.append(f"<td>{totals['Unique TBMs']}</td>")
+    parts.append(f"<td>{totals['Unique HCPs']}</td>")
+    parts.append(f"<td style='font-size: 12px;'>{totals['Requests Raised']}</td>")
+    parts.append(f"<td>{totals['Request Cancelled Out of Stock']}</td>")
+    parts.append(f"<td>{totals['Action Pending at HO']}</td>")
+    parts.append(f"<td>{totals['Sent to HUB']}</td>")
+    parts.append(f"<td>{totals['Pending for Invoicing']}</td>")
+    parts.append(f"<td>{totals['Pending for Dispatch']}</td>")
+    parts.append(f"<td>{totals['Requests Dispatched']}</td>")
+    parts.append(f"<td>{totals['Delivered']}</td>")
+    parts.append(f"<td>{totals['Dispatched In Transit']}</td>")
+    parts.append(f"<td>{totals['RTO']}</td>")
+    parts.append(f"<td>{totals['Incomplete Address']}</td>")
+    parts.append(f"<td>{totals['Doctor Non Contactable']}</td>")
+    parts.append(f"<td>{totals['Doctor Refused to Accept']}</td>")
+    parts.append("</tr>")
+    
+    parts.append(SUMMARY_TABLE_FOOTER_HTML)
+    
+    return ''.join(parts)
 
-def display_single_email(outlook, zbm_email, cc_emails, email_content, zbm_code, zbm_name):
+def display_single_email(outlook, zbm_email, cc_emails, email_content, consolidated_file, current_date):
     """Display a single email in Outlook for review (without sending)"""
     
+    # Prepare everything before touching Outlook so the COM property sets run back to back
+    subject = f"Sample Direct Dispatch to Doctors - Request Status as of {current_date}"
+    # The file was found by find_zbm_files, so there is no need to check the disk again
+    attach = consolidated_file is not None
+    
     # Create new mail item
     mail = outlook.CreateItem(0)  # 0 = olMailItem
     
@@ -412,15 +464,13 @@ def display_single_email(outlook, zbm_email, cc_emails, email_content, zbm_code,
         mail.CC = cc_emails
     
     # Set subject
-    current_date = datetime.now().strftime('%B %d, %Y')
-    mail.Subject = f"Sample Direct Dispatch to Doctors - Request Status as of {current_date}"
+    mail.Subject = subject
     
     # Set body
     mail.HTMLBody = email_content
     
     # Add attachment (consolidated file)
-    consolidated_file = find_consolidated_file(zbm_code, zbm_name)
-    if consolidated_file and os.path.exists(consolidated_file):
+    if attach:
         mail.Attachments.Add(consolidated_file)
         print(f"   📎 Attached: {os.path.basename(consolidated_file)}")
     
@@ -432,18 +482,7 @@ def display_single_email(outlook, zbm_email, cc_emails, email_content, zbm_code,
         print(f"   📧 CC'd to: {cc_emails}")
     print(f"   ⚠️  Review the email and send manually from Outlook")
 
-def find_consolidated_file(zbm_code, zbm_name):
-    """Find the consolidated file for this ZBM"""
-    
-    # Look for consolidated files in current directory and subdirectories
-    for root, dirs, files in os.walk('.'):
-        for file in files:
-            if file.startswith(f"ZBM_Consolidated_{zbm_code}_") and file.endswith('.xlsx'):
-                return os.path.join(root, file)
-    
-    return None
-
-def create_html_email_files(df, zbms):
+def create_html_email_files(payloads, current_date):
     """Create HTML email files as fallback when Outlook is not available"""
     
     print("📧 Creating HTML email files...")
@@ -456,36 +495,12 @@ def create_html_email_files(df, zbms):
     
     success_count = 0
     
-    for _, zbm_row in zbms.iterrows():
-        zbm_code = zbm_row['ZBM Terr Code']
-        zbm_name = zbm_row['ZBM Name']
-        zbm_email = zbm_row['ZBM EMAIL_ID']
-        
-        print(f"\n🔄 Processing ZBM: {zbm_code} - {zbm_name}")
-        
+    # All files in the batch share the folder's timestamp
+    for zbm_code, zbm_name, zbm_email, email_content, cc_emails in payloads:
         try:
-            # Read the actual ZBM summary report file
-            zbm_summary_df = read_zbm_summary_report(zbm_code, zbm_name)
-            
-            if zbm_summary_df is None or zbm_summary_df.empty:
-                print(f"⚠️ No ZBM summary report found for {zbm_code}")
-                continue
-            
-            # Convert summary report data to email format
-            summary_data = create_summary_data_from_report(zbm_summary_df)
-            summary_df = pd.DataFrame(summary_data)
-            
-            # Get ABM emails for CC from the original data
-            zbm_data = df[df['ZBM Terr Code'] == zbm_code]
-            abms = zbm_data.groupby(['ABM Terr Code', 'ABM Name', 'ABM EMAIL_ID']).agg({
-                'TBM HQ': 'first'
-            }).reset_index()
-            
-            # Generate email content
-            email_content, cc_emails = generate_email_content(zbm_name, zbm_email, abms, summary_df)
-            
             # Create HTML email file
-            create_single_html_email(zbm_code, zbm_name, zbm_email, cc_emails, email_content, output_dir)
+            create_single_html_email(zbm_code, zbm_name, zbm_email, cc_emails, email_content, output_dir,
+                                     current_date, timestamp)
             
             success_count += 1
             print(f"   ✅ HTML email created for {zbm_name}")
@@ -499,11 +514,9 @@ def create_html_email_files(df, zbms):
     print(f"📁 Files saved in: {output_dir}")
     print(f"📧 You can open these HTML files in your browser and copy content to Outlook")
 
-def create_single_html_email(zbm_code, zbm_name, zbm_email, cc_emails, email_content, output_dir):
+def create_single_html_email(zbm_code, zbm_name, zbm_email, cc_emails, email_content, output_dir, current_date, timestamp):
     """Create a single HTML email file"""
     
-    current_date = datetime.now().strftime('%B %d, %Y')
-    
     # Create full HTML email
     html_email = f"""
 <!DOCTYPE html>
@@ -511,14 +524,7 @@ def create_single_html_email(zbm_code, zbm_name, zbm_email, cc_emails, email_con
 <head>
     <meta charset="UTF-8">
     <title>Sample Direct Dispatch to Doctors - Request Status as of {current_date}</title>
-    <style>
-        body {{ font-family: Arial, sans-serif; margin: 20px; }}
-        table {{ border-collapse: collapse; width: 100%; margin: 20px 0; }}
-        th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-        th {{ background-color: #f2f2f2; font-weight: bold; }}
-        .total-row {{ background-color: #e0e0e0; font-weight: bold; }}
-        .header {{ background-color: #f0f0f0; padding: 10px; margin-bottom: 20px; }}
-    </style>
+{HTML_EMAIL_STYLE}
 </head>
 <body>
     <div class="header">
@@ -549,11 +555,10 @@ def create_single_html_email(zbm_code, zbm_name, zbm_email, cc_emails, email_con
     
     # Save HTML file
     safe_zbm_name = str(zbm_name).replace(' ', '_').replace('/', '_').replace('\\', '_')
-    filename = f"Email_{zbm_code}_{safe_zbm_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
-    filepath = os.path.join(output_dir, filename)
+    filename = f"Email_{zbm_code}_{safe_zbm_name}_{timestamp}.html"
     
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(html_email)
+    # Encode once and write the bytes in a single call
+    Path(output_dir, filename).write_bytes(html_email.encode('utf-8'))
     
     print(f"   📧 HTML email saved: {filename}")
 
@@ -0,0 +1,184 @@
+"""
+Shared master tracker pipeline for the ZBM summary scripts
+Reads master_tracker.csv once per process (cached as Parquet between runs when pyarrow is
+installed), cleans it, builds the Sheet2 status rules from logic.xlsx and computes each
+request's Final Answer from them
+Used by hierarchical_zbm_summary.py, manager_presentation_demo.py and create_zbm_email_drafts.py
+(the last two also for the Final Answer); the rules and normalization are also used by
+create_zbm_hierarchical_reports.py, and cached_read (the Parquet cache) by
+create_zbm_hierarchical_reports.py and send_zbm_emails.py
+"""
+
+import pandas as pd
+import os
+import zlib
+from functools import lru_cache
+from logic_rules import load_rule_rows, EXCEL_ENGINE  # noqa: F401
+
+MASTER_TRACKER_CSV = 'master_tracker.csv'
+
+# Every tracker column the summary scripts use; each script checks the ones it needs
+TRACKER_COLUMNS = ['ZBM Terr Code', 'ZBM Name', 'ZBM EMAIL_ID',
+                   'ABM Terr Code', 'ABM Name', 'ABM EMAIL_ID',
+                   'TBM HQ', 'TBM EMAIL_ID',
+                   'Doctor: Customer Code', 'Assigned Request Ids', 'Request Status', 'Rto Reason']
+
+# Repeated string columns kept as categoricals by default, so comparisons, grouping and nunique
+# work on small integer codes instead of hashing strings
+CATEGORY_COLUMNS = ['ZBM Terr Code', 'ZBM Name', 'ZBM EMAIL_ID', 'ABM Terr Code', 'ABM Name',
+                    'ABM EMAIL_ID', 'TBM HQ', 'TBM EMAIL_ID', 'Doctor: Customer Code']
+
+# Two-status rules missing from logic.xlsx, identified from validation; used on top of the Sheet2
+# rules by manager_presentation_demo.py and create_zbm_email_drafts.py (where a pair is also in
+# Sheet2, the answer here wins)
+PAIR_RULES = {
+    ('action pending / in process', 'delivered'): 'Delivered',
+    ('action pending / in process', 'dispatched & in transit'): 'Dispatched & In Transit',
+    ('action pending / in process', 'dispatch pending'): 'Dispatch Pending',
+    ('action pending / in process', 'out of stock'): 'Out of stock',
+    ('action pending / in process', 'return'): 'Return',
+    ('delivered', 'return'): 'Delivered',
+    ('dispatch pending', 'dispatched & in transit'): 'Dispatched & In Transit',
+    ('dispatch pending', 'return'): 'Return',
+    ('dispatched & in transit', 'return'): 'Dispatched & In Transit',
+    ('out of stock', 'return'): 'Out of stock',
+    ('request raised', 'return'): 'Return',
+}
+
+# pyarrow is optional; when installed, CSV files are parsed with its multithreaded reader, text
+# columns can be held in Arrow string arrays, and parsed trackers are cached as Parquet between
+# runs (see cached_read) so an unchanged file is not parsed again. The xlsx engine switch
+# (EXCEL_ENGINE, python-calamine) lives in logic_rules and is imported from here with these
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+    STRING_DTYPE = 'string[pyarrow]'
+    CACHE_DIR = '.cache'
+except ImportError:
+    CSV_ENGINE = 'c'
+    STRING_DTYPE = 'string'
+    CACHE_DIR = None
+
+def cached_read(reader, path, prefix, **read_kwargs):
+    """Return reader(path, **read_kwargs), reusing a Parquet copy cached for this version of the file and these read options
+
+    Cache files are named <prefix>_<mtime>_<size>_<options hash>.parquet; each caller uses its own
+    prefix, and only older copies with that prefix are removed
+    """
+    if CACHE_DIR is None:
+        return reader(path, **read_kwargs)
+    
+    stat = os.stat(path)
+    options_key = zlib.crc32(repr(sorted(read_kwargs.items())).encode())
+    cache_path = os.path.join(CACHE_DIR, f"{prefix}_{stat.st_mtime_ns}_{stat.st_size}_{options_key:08x}.parquet")
+    if os.path.exists(cache_path):
+        try:
+            return pd.read_parquet(cache_path)
+        except Exception as e:
+            print(f"⚠️ Could not read cached tracker {cache_path} ({e}), re-reading {path}")
+    
+    df = reader(path, **read_kwargs)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        df.to_parquet(cache_path, compression='zstd')
+        # Drop this caller's caches of older versions of the file
+        for name in os.listdir(CACHE_DIR):
+            if name.startswith(f"{prefix}_") and name != os.path.basename(cache_path):
+                os.remove(os.path.join(CACHE_DIR, name))
+    except Exception as e:
+        print(f"⚠️ Tracker cache not written ({e})")
+    return df
+
+@lru_cache(maxsize=1)
+def _read_tracker_columns(path):
+    """Read the tracker columns present in the file, all as text (kept for the rest of the process)"""
+
+    # Header first, so missing columns are reported by the caller instead of failing the read
+    header = pd.read_csv(path, encoding='latin-1', nrows=0).columns
+    return cached_read(pd.read_csv, path, 'tracker', encoding='latin-1', usecols=[c for c in TRACKER_COLUMNS if c in header],
+                       dtype='string', engine=CSV_ENGINE)
+
+def load_master_tracker(required_columns, path=MASTER_TRACKER_CSV, category_columns=CATEGORY_COLUMNS):
+    """Read and clean the master tracker, with category_columns as categoricals; returns None (after printing why) when it cannot be used"""
+
+    # Read master tracker data (only the columns used, all as text)
+    print("📖 Reading master_tracker.csv...")
+    try:
+        df = _read_tracker_columns(path)
+        print(f"✅ Successfully loaded {len(df)} records from master_tracker.csv")
+    except Exception as e:
+        print(f"❌ Error reading master_tracker.csv: {e}")
+        return None
+    
+    # Clean and prepare data
+    print("🧹 Cleaning and preparing data...")
+    
+    # Ensure required columns exist
+    missing = [c for c in required_columns if c not in df.columns]
+    if missing:
+        print(f"❌ Missing required columns in master_tracker.csv: {missing}")
+        return None
+
+    # Remove rows where key fields are null or empty (each step returns a new frame, so the
+    # cached tracker is never modified)
+    df = df.dropna(subset=['ZBM Terr Code', 'ZBM Name', 'ABM Terr Code', 'ABM Name', 'TBM HQ'])
+    df = df[df['ZBM Terr Code'].astype(str).str.strip() != '']
+    df = df[df['ABM Terr Code'].astype(str).str.strip() != '']
+    df = df[df['TBM HQ'].astype(str).str.strip() != '']
+
+    print(f"📊 After cleaning: {len(df)} records remaining")
+
+    return df.astype({col: 'category' for col in category_columns})
+
+def normalize(text):
+    """Normalize a request status for rule matching"""
+    normalized = str(text).strip().casefold()
+    normalized = normalized.replace('  ', ' ')  # Fix spacing issues
+    return normalized
+
+def build_rules(additional_rules):
+    """Sheet2 rules from logic.xlsx (cached in logic_rules.json until logic.xlsx changes) plus the given extra rules, keyed by the frozenset of normalized statuses"""
+
+    rules = {}
+    for statuses, final_answer in load_rule_rows():
+        rules[frozenset(normalize(s) for s in statuses)] = final_answer
+    rules.update((frozenset(statuses), final_answer) for statuses, final_answer in additional_rules.items())
+    return rules
+
+
+def compute_final_answers(df, rules):
+    """Final Answer for every tracker row: the rule for the set of its request's normalized statuses, else the request's most common status ('Unknown' without a request id)"""
+
+    # Normalize each distinct status once, then key every request by the set of its normalized statuses
+    statuses = df['Request Status'].dropna()
+    normalized_statuses = statuses.map({status: normalize(status) for status in statuses.unique()})
+    request_statuses = (pd.DataFrame({'Assigned Request Ids': df['Assigned Request Ids'], 'Status': normalized_statuses})
+                        .dropna()
+                        .drop_duplicates())
+    request_keys = request_statuses.groupby('Assigned Request Ids', observed=True, sort=False)['Status'].agg(frozenset)
+
+    unique_requests = df['Assigned Request Ids'].unique()
+    print(f"🔍 Computing final answers for {len(unique_requests)} unique requests...")
+
+    # Requests without any status get the empty key
+    request_keys = request_keys.reindex(pd.Index(unique_requests).dropna())
+    final_answers = pd.Series([rules.get(key if isinstance(key, frozenset) else frozenset()) for key in request_keys],
+                              index=request_keys.index, dtype=object)
+
+    # If no rule found, use the most common status of the request (ties go to the
+    # alphabetically first status, as Series.mode does), counted for all unmatched requests at once.
+    # Only observed (request, status) pairs are counted: with categorical request ids, an
+    # unobserved pair would hand a request without statuses someone else's status instead of 'Unknown'
+    unmatched = final_answers.index[final_answers.isna()]
+    if len(unmatched) > 0:
+        status_counts = (df.loc[df['Assigned Request Ids'].isin(unmatched), ['Assigned Request Ids', 'Request Status']]
+                         .groupby(['Assigned Request Ids', 'Request Status'], observed=True)
+                         .size()
+                         .rename('Count')
+                         .reset_index()
+                         .sort_values(['Count', 'Request Status'], ascending=[False, True], kind='stable'))
+        most_common_status = status_counts.drop_duplicates('Assigned Request Ids').set_index('Assigned Request Ids')['Request Status']
+        final_answers = final_answers.fillna(most_common_status.astype(object))
+
+    # Map final answers back to the rows (rows without a request id are 'Unknown')
+    return df['Assigned Request Ids'].map(final_answers).astype(object).fillna('Unknown')
\ No newline at end of file